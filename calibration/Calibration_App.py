@@ -1,13 +1,18 @@
+import hashlib
 import json
+import os
 import cv2
 import numpy as np
 
+from perception.calibration_cache import H_CACHE
+
 
 # ===============================
 # Global Variables
 # ===============================
 hmatrix = []
 image_pts = []
+num_image_pts = 4
 
 # ===============================
 # Capture Image and Save
@@ -50,8 +55,10 @@ def CaptureImg():
 # Save Computed H Matrix to JSON
 # ===============================
 def Save_H_Matrix(H):
-    with open("output/H_matrix.json", "w") as f:
+    # Write then rename, so running detectors never read a half-written file
+    with open("output/H_matrix.json.tmp", "w") as f:
         json.dump(H.tolist(), f, indent=4)
+    os.replace("output/H_matrix.json.tmp", "output/H_matrix.json")
     print("Homography matrix saved to H_matrix.json")
     return True
 
@@ -62,56 +69,374 @@ def Save_H_Matrix(H):
 def click_event(event, x, y, flags, param):
     global image_pts
     img = param
-    if event == cv2.EVENT_LBUTTONDOWN and len(image_pts) < 4:
+    if event == cv2.EVENT_LBUTTONDOWN and len(image_pts) < num_image_pts:
         image_pts.append([x, y])
         print(f"Image Point {len(image_pts)}: ({x}, {y})")
         
         cv2.circle(img, (x, y), 2, (0, 0, 255), -1)
         cv2.imshow("Image", img)
 
-        if len(image_pts) == 4:
+        if len(image_pts) == num_image_pts:
             cv2.destroyAllWindows()
             return image_pts
 
 # ===============================
 # Generate Homography Matrix from Image Points and Robot Points
 # ===============================
-def Generate_H_Matrix():
-    robot_pts = []
-    image_pts = []
+RANSAC_THRESHOLD_MM = 3.0
 
+def Load_Point_Pairs():
     # Load JSON file
     with open("./output/robot_coordinates.json", "r") as f:
         datarbt = json.load(f)
     with open("./output/image_points.json", "r") as f:
         dataimg = json.load(f)
 
-    # Read points in order
-    for i in range(1, 5):
-        rbt_point = datarbt[f"point{i}"]
-        x = float(rbt_point["x"])
-        y = float(rbt_point["y"])
-        robot_pts.append([x, y])
-        img_point = dataimg[f"point{i}"]
-        x = float(img_point["x"])
-        y = float(img_point["y"])
-        image_pts.append([x, y])
-    robot_pts = np.array(robot_pts, dtype=np.float32)
-    img_pts = np.array(image_pts, dtype=np.float32)
+    # Read points in order (pointN keys present in both files)
+    keys = sorted(set(datarbt) & set(dataimg), key=lambda k: int(k[len("point"):]))
+
+    robot_pts = []
+    image_pts = []
+    for key in keys:
+        rbt_point = datarbt[key]
+        robot_pts.append([float(rbt_point["x"]), float(rbt_point["y"])])
+        img_point = dataimg[key]
+        image_pts.append([float(img_point["x"]), float(img_point["y"])])
+
+    return np.array(image_pts, dtype=np.float32), np.array(robot_pts, dtype=np.float32)
+
+def Reprojection_Errors(H, img_pts, robot_pts):
+    projected = cv2.perspectiveTransform(img_pts.reshape(-1, 1, 2).astype(np.float64), H)
+    return np.linalg.norm(projected.reshape(-1, 2) - robot_pts, axis=1)
+
+def Save_Calibration_Report(report):
+    with open("output/calibration_report.json", "w") as f:
+        json.dump(report, f, indent=4)
+    print("Calibration report saved to output/calibration_report.json")
+
+def Generate_H_Matrix():
+    img_pts, robot_pts = Load_Point_Pairs()
+
+    if len(img_pts) < 4:
+        print("Error: At least 4 point pairs are required.")
+        return False
+
+    # Fit in undistorted pixel space when the lens has been calibrated
+    intrinsics = Load_Camera_Intrinsics()
+    if intrinsics is not None:
+        K, dist = intrinsics
+        img_pts = cv2.undistortPoints(img_pts.reshape(-1, 1, 2), K, dist, P=K).reshape(-1, 2)
+
+    # Compute homography (RANSAC needs more than the minimal 4 points)
+    if len(img_pts) > 4:
+        H, mask = cv2.findHomography(img_pts, robot_pts, cv2.RANSAC, RANSAC_THRESHOLD_MM)
+    else:
+        H, mask = cv2.findHomography(img_pts, robot_pts)
+
+    if H is None:
+        print("Error: Homography could not be computed (degenerate points?)")
+        return False
+
+    inliers = mask.ravel().astype(bool)
+    errors = Reprojection_Errors(H, img_pts, robot_pts)
+
+    report = {
+        "points": int(len(img_pts)),
+        "inliers": int(inliers.sum()),
+        "outliers": [int(i) + 1 for i in np.flatnonzero(~inliers)],
+        "rms_error_mm": float(np.sqrt(np.mean(errors[inliers] ** 2))),
+        "mean_error_mm": float(errors[inliers].mean()),
+        "max_error_mm": float(errors[inliers].max()),
+        "per_point_error_mm": [float(e) for e in errors],
+        "undistorted": intrinsics is not None,
+    }
 
-    # Compute homography    
-    H, mask = cv2.findHomography(img_pts, robot_pts)
     print("\nHomography Matrix H:")
     print(H)
+    print(f"Reprojection error: rms {report['rms_error_mm']:.3f} mm, "
+          f"max {report['max_error_mm']:.3f} mm, "
+          f"{report['inliers']}/{report['points']} inliers")
+
+    Save_Calibration_Report(report)
+    Save_H_Matrix(H)
+    return Save_Pixel_World_Map(H)
+
+# ===============================
+# Camera Intrinsics and Lens Undistortion
+# ===============================
+def Find_Checkerboard(img, board_size=(9, 6)):
+    """
+    Detect the inner corners of a checkerboard with sub-pixel refinement
+
+    Returns the (N, 2) corners in row-major order, or None.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    found, corners = cv2.findChessboardCorners(gray, board_size)
+    if not found:
+        return None
 
-    return Save_H_Matrix(H)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+    return corners.reshape(-1, 2)
+
+def Calibrate_Camera(image_paths, board_size=(9, 6), square_size=25.0):
+    """
+    Compute camera intrinsics from checkerboard images and save them
+    together with the undistortion remap tables
+
+    Returns the RMS reprojection error in pixels, or None.
+    """
+    board = np.zeros((board_size[0] * board_size[1], 3), np.float32)
+    board[:, :2] = np.mgrid[0:board_size[0], 0:board_size[1]].T.reshape(-1, 2) * square_size
+
+    object_points = []
+    image_points = []
+    image_size = None
+
+    for path in image_paths:
+        img = cv2.imread(path)
+        if img is None:
+            print(f"Skipping {path}: not found")
+            continue
+
+        corners = Find_Checkerboard(img, board_size)
+        if corners is None:
+            print(f"Skipping {path}: board not found")
+            continue
+
+        image_size = (img.shape[1], img.shape[0])
+        object_points.append(board)
+        image_points.append(corners.astype(np.float32))
+
+    if len(image_points) < 3:
+        print("Error: At least 3 images with a detected board are required.")
+        return None
+
+    rms, K, dist, _, _ = cv2.calibrateCamera(object_points, image_points, image_size, None, None)
+    print(f"Camera calibrated from {len(image_points)} images, RMS {rms:.3f} px")
+
+    with open("output/camera_intrinsics.json", "w") as f:
+        json.dump({
+            "K": K.tolist(),
+            "dist": dist.ravel().tolist(),
+            "image_size": list(image_size),
+            "rms_px": rms,
+        }, f, indent=4)
+
+    Save_Undistort_Maps(K, dist, image_size)
+    return rms
+
+def Get_Board_Image_Points(board_size=(9, 6)):
+    """
+    Use the checkerboard corners in the captured image as calibration
+    points instead of clicking; robot_coordinates.json must list the
+    same corners in row-major order.
+    """
+    img = cv2.imread("./output/captured_img.png")
+
+    if img is None:
+        print("Error: Image not found.")
+        return None
+
+    corners = Find_Checkerboard(img, board_size)
+    if corners is None:
+        print("Error: Checkerboard not found.")
+        return None
+
+    Save_Image_Points(corners)
+    return corners
+
+def Load_Camera_Intrinsics():
+    if not os.path.exists("output/camera_intrinsics.json"):
+        return None
+
+    with open("output/camera_intrinsics.json", "r") as f:
+        data = json.load(f)
+
+    return np.array(data["K"], dtype=np.float64), np.array(data["dist"], dtype=np.float64)
+
+def Save_Undistort_Maps(K, dist, image_size):
+    # Fixed-point maps: cv2.remap then costs one table lookup pass per frame
+    map1, map2 = cv2.initUndistortRectifyMap(K, dist, None, K, image_size, cv2.CV_16SC2)
+
+    with open("output/undistort_maps.npz.tmp", "wb") as f:
+        np.savez(f, map1=map1, map2=map2)
+    os.replace("output/undistort_maps.npz.tmp", "output/undistort_maps.npz")
+    print("Undistortion maps saved to output/undistort_maps.npz")
+
+# ===============================
+# Dense Pixel -> World Lookup Map
+# ===============================
+PIXEL_MAP_STEP = 1
+
+def Save_Pixel_World_Map(H, step=PIXEL_MAP_STEP):
+    """
+    Bake a float32 (rows, cols, 2) raw-pixel -> robot XY table sampled every
+    `step` pixels, folding lens distortion and the homography into one
+    lookup. Saved as .npy (memory-mapped by readers) plus a JSON sidecar
+    tying it to the H_matrix.json it was built from.
+    """
+    intrinsics = Load_Camera_Intrinsics()
+
+    img = cv2.imread("./output/captured_img.png")
+    if img is None:
+        print("Error: Image not found, pixel map not written.")
+        return False
+    height, width = img.shape[:2]
+
+    cols = (width - 1 + step - 1) // step + 1
+    rows = (height - 1 + step - 1) // step + 1
+    u, v = np.meshgrid(np.arange(cols) * step, np.arange(rows) * step)
+    pixels = np.stack([u, v], axis=-1).reshape(-1, 1, 2).astype(np.float64)
+
+    if intrinsics is not None:
+        K, dist = intrinsics
+        pixels = cv2.undistortPoints(pixels, K, dist, P=K).astype(np.float64)
+
+    world = cv2.perspectiveTransform(pixels, H).reshape(rows, cols, 2).astype(np.float32)
+
+    np.save("output/pixel_world_map.tmp.npy", world)
+    os.replace("output/pixel_world_map.tmp.npy", "output/pixel_world_map.npy")
+
+    with open("output/H_matrix.json", "rb") as f:
+        h_digest = hashlib.sha1(f.read()).hexdigest()
+
+    # Sidecar replaced atomically too: readers poll it for changes
+    with open("output/pixel_world_map.json.tmp", "w") as f:
+        json.dump({
+            "step": step,
+            "image_size": [width, height],
+            "undistorted": intrinsics is not None,
+            "h_matrix_sha1": h_digest,
+        }, f, indent=4)
+    os.replace("output/pixel_world_map.json.tmp", "output/pixel_world_map.json")
+
+    print(f"Pixel -> world map ({cols}x{rows}, step {step}) saved to output/pixel_world_map.npy")
+    return True
+
+# ===============================
+# Automatic Fiducial (ArUco) Calibration
+# ===============================
+# Marker id k sits at robot point{k+1} in robot_coordinates.json
+ARUCO_DICT = cv2.aruco.DICT_4X4_50
+DRIFT_THRESHOLD_MM = 2.0
+
+aruco_detector = None
+
+def Get_Aruco_Detector():
+    global aruco_detector
+    if aruco_detector is None:
+        dictionary = cv2.aruco.getPredefinedDictionary(ARUCO_DICT)
+        aruco_detector = cv2.aruco.ArucoDetector(dictionary, cv2.aruco.DetectorParameters())
+    return aruco_detector
+
+def Detect_Markers(img):
+    """
+    Detect ArUco markers and return {marker id: (cx, cy)} marker centers
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    corners, ids, _ = Get_Aruco_Detector().detectMarkers(gray)
+    if ids is None:
+        return {}
+
+    centers = np.array([c.reshape(4, 2).mean(axis=0) for c in corners])
+    return {int(i): (float(x), float(y)) for i, (x, y) in zip(ids.ravel(), centers)}
+
+def Get_Marker_Image_Points(img=None):
+    """
+    Headless replacement for Get_Image_Points: marker centers become the
+    calibration image points, keyed by marker id
+    """
+    if img is None:
+        img = cv2.imread("./output/captured_img.png")
+
+    if img is None:
+        print("Error: Image not found.")
+        return None
+
+    markers = Detect_Markers(img)
+    if len(markers) < 4:
+        print(f"Error: Found {len(markers)} markers, at least 4 are required.")
+        return None
+
+    Save_Image_Points({i + 1: xy for i, xy in sorted(markers.items())})
+    return markers
+
+def Auto_Calibrate(img=None):
+    """
+    Detect the markers and regenerate the homography, no clicking involved
+    """
+    if Get_Marker_Image_Points(img) is None:
+        return False
+    return Generate_H_Matrix()
+
+class Calibration_Monitor:
+    """
+    Re-verify the calibration on every Nth live frame by projecting the
+    detected marker centers through H and comparing them with the robot
+    coordinates of the markers
+    """
+
+    def __init__(self, every_n=30, threshold_mm=DRIFT_THRESHOLD_MM):
+        self.every_n = every_n
+        self.threshold_mm = threshold_mm
+        self.frame_count = 0
+        self.last_rms_mm = None
+        self.drift = False
+        self.h_version = None
+
+    def reload(self):
+        """Re-read the robot marker positions (done automatically when H changes)"""
+        with open("./output/robot_coordinates.json", "r") as f:
+            datarbt = json.load(f)
+        self.robot_pts = {int(k[len("point"):]) - 1: (float(p["x"]), float(p["y"]))
+                          for k, p in datarbt.items()}
+        self.intrinsics = Load_Camera_Intrinsics()
+
+    def check(self, frame):
+        """
+        Call once per frame; returns True when drift was detected on this call
+        """
+        self.frame_count += 1
+        if self.frame_count % self.every_n:
+            return False
+
+        # H from the shared cache: a recalibration (Auto_Calibrate,
+        # Run_Robot_Calibration) is picked up without a manual reload
+        H = H_CACHE.get()
+        if H_CACHE.version != self.h_version:
+            self.reload()
+            self.h_version = H_CACHE.version
+            self.drift = False
+
+        markers = Detect_Markers(frame)
+        ids = [i for i in markers if i in self.robot_pts]
+        if len(ids) < 2:
+            return False  # markers occluded (e.g. by the arm); try again later
+
+        img_pts = np.array([markers[i] for i in ids], dtype=np.float32)
+        if self.intrinsics is not None:
+            K, dist = self.intrinsics
+            img_pts = cv2.undistortPoints(img_pts.reshape(-1, 1, 2), K, dist, P=K).reshape(-1, 2)
+        robot_pts = np.array([self.robot_pts[i] for i in ids], dtype=np.float64)
+
+        errors = Reprojection_Errors(H, img_pts, robot_pts)
+        self.last_rms_mm = float(np.sqrt(np.mean(errors ** 2)))
+        self.drift = self.last_rms_mm > self.threshold_mm
+
+        if self.drift:
+            print(f"Calibration drift: rms {self.last_rms_mm:.2f} mm over {len(ids)} markers")
+        return self.drift
 
 # -----------------------------
 # Get Image Points by Clicking on the Captured Image
 # -----------------------------
-def Get_Image_Points():
-    global image_pts
+def Get_Image_Points(num_points=4):
+    global image_pts, num_image_pts
     image_pts = []  # reset before collecting
+    num_image_pts = num_points
 
     img = cv2.imread("./output/captured_img.png")
 
@@ -125,11 +450,11 @@ def Get_Image_Points():
     cv2.waitKey(0)
     cv2.destroyAllWindows()
 
-    if len(image_pts) == 4:
+    if len(image_pts) == num_points:
         Save_Image_Points(image_pts)   # 🔥 Save to JSON
         return image_pts
     else:
-        print("Error: You must select exactly 4 points.")
+        print(f"Error: You must select exactly {num_points} points.")
         return None
     
 # -----------------------------
@@ -152,9 +477,11 @@ def Open_Image(path):
 # Save Image Points to JSON
 # -----------------------------
 def Save_Image_Points(points):
+    # points: list of (x, y) in order, or dict {point number: (x, y)}
     data = {}
 
-    for i, (x, y) in enumerate(points, start=1):
+    items = points.items() if isinstance(points, dict) else enumerate(points, start=1)
+    for i, (x, y) in items:
         data[f"point{i}"] = {
             "x": float(x),
             "y": float(y)
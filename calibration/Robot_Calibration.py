@@ -0,0 +1,154 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import calibration.Calibration_App as calib
+from perception.dobot_controller import MoveJ, WaitArrive
+from perception.robot_move import PICK_Z
+
+
+# ===============================
+# Global Variables
+# ===============================
+# Grid of robot XY poses (mm) the arm visits while carrying the marker
+GRID_X = (250.0, 380.0)
+GRID_Y = (-100.0, 100.0)
+GRID_SIZE = (3, 3)
+
+# The homography is only exact in the plane it was measured in, so the
+# marker face is brought to the part surface (PICK_Z) that detections are
+# mapped onto; any other height adds parallax growing towards the edges
+# of the field of view.
+MARKER_HEIGHT = 0.0         # marker face above the TCP (mm)
+MARKER_Z = PICK_Z - MARKER_HEIGHT   # TCP height while the marker is shown
+MARKER_R = 0.0
+MARKER_ID = 0               # ArUco id of the marker fixed to the tool
+MARKER_OFFSET = (0.0, 0.0)  # marker center relative to the TCP (mm, robot XY)
+
+SETTLE_TIME = 0.2           # s between arrival and frame grab (vibration)
+
+# ===============================
+# Pose Grid
+# ===============================
+def Grid_Poses(grid_x=GRID_X, grid_y=GRID_Y, grid_size=GRID_SIZE, z=MARKER_Z, r=MARKER_R):
+    """
+    Serpentine grid of [x, y, z, r] poses so consecutive moves stay short
+    """
+    xs = np.linspace(grid_x[0], grid_x[1], grid_size[0])
+    ys = np.linspace(grid_y[0], grid_y[1], grid_size[1])
+
+    poses = []
+    for row, x in enumerate(xs):
+        for y in (ys if row % 2 == 0 else ys[::-1]):
+            poses.append([float(x), float(y), z, r])
+    return poses
+
+# ===============================
+# Frame Sources
+# ===============================
+def Camera_Frame_Source(camera_index=1):
+    """
+    Returns (grab, release) for a cv2.VideoCapture; grab() drops the
+    buffered frame so the returned image was taken after the call
+    """
+    cap = cv2.VideoCapture(camera_index)
+    if not cap.isOpened():
+        raise RuntimeError("Could not open camera.")
+
+    def grab():
+        cap.grab()                 # stale frame from the driver buffer
+        ret, frame = cap.read()
+        if not ret:
+            raise RuntimeError("Failed to grab frame")
+        return frame
+
+    return grab, cap.release
+
+def Bus_Frame_Source(bus, timeout=2.0):
+    """
+    Returns (grab, release) reading the vision process' frames from a
+    shm_bus.DetectionBus; grab() waits for a frame newer than the call
+    """
+    from perception.shm_bus import FRAME_SEQ
+
+    def grab():
+        seq = bus.sequence(FRAME_SEQ)
+        deadline = time.monotonic() + timeout
+        while bus.sequence(FRAME_SEQ) <= seq + 1:   # +1: may be mid-exposure
+            if time.monotonic() > deadline:
+                raise TimeoutError("No fresh frame on the detection bus")
+            time.sleep(0.001)
+        return bus.read_frame()[2]
+
+    return grab, lambda: None
+
+# ===============================
+# Calibration Routine
+# ===============================
+def Locate_Marker(frame, marker_id=MARKER_ID):
+    return calib.Detect_Markers(frame).get(marker_id)
+
+def Run_Robot_Calibration(move, frame_source=None, poses=None, marker_id=MARKER_ID):
+    """
+    Drive the arm over the pose grid, detect the tool marker at each pose
+    and solve the homography from the collected pairs
+
+    Detection of the frame taken at pose i runs on a worker thread while
+    the arm is already travelling to pose i + 1.
+
+    Args:
+        move: DobotApiMove object of a connected, enabled robot
+        frame_source: (grab, release) pair, default Camera_Frame_Source()
+        poses: list of [x, y, z, r], default Grid_Poses()
+        marker_id: ArUco id on the tool
+
+    Returns:
+        bool: True when H_matrix.json was regenerated
+    """
+    if poses is None:
+        poses = Grid_Poses()
+    grab, release = frame_source if frame_source is not None else Camera_Frame_Source()
+
+    pending = []
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            for pose in poses:
+                MoveJ(move, pose)
+                if not WaitArrive(pose, tolerance=1.0, timeout=10.0):
+                    print(f"Skipping pose {pose}: not reached")
+                    continue
+
+                time.sleep(SETTLE_TIME)
+                frame = grab()
+
+                # Detect while the next move runs
+                pending.append((pose, pool.submit(Locate_Marker, frame, marker_id)))
+
+            pairs = [(pose, future.result()) for pose, future in pending]
+    finally:
+        release()
+
+    robot_points = {}
+    image_points = {}
+    for pose, center in pairs:
+        if center is None:
+            print(f"Marker not visible at pose {pose}")
+            continue
+        n = len(robot_points) + 1
+        robot_points[f"point{n}"] = {"x": pose[0] + MARKER_OFFSET[0],
+                                     "y": pose[1] + MARKER_OFFSET[1]}
+        image_points[n] = center
+
+    print(f"Marker found at {len(image_points)}/{len(poses)} poses")
+    if len(image_points) < 4:
+        print("Error: At least 4 marker observations are required.")
+        return False
+
+    with open("output/robot_coordinates.json", "w") as f:
+        json.dump(robot_points, f, indent=4)
+    calib.Save_Image_Points(image_points)
+
+    return calib.Generate_H_Matrix()
@@ -1,6 +1,7 @@
 import perception.object as obj
 import calibration.Calibration_App as calib
 import perception.robot_move as move
+import perception.robot_cell as cells
 import perception.shape as col
 import subprocess
 import sys
@@ -22,10 +23,11 @@ def main():
     print("3. Run Shape & Color Detection")
     print("4. Run Robot Movement")
     print("5. Run Streamlit UI")
-    print("6. Exit")
+    print("6. Run Multi-Robot Cells")
+    print("7. Exit")
     print("==================================================================================")
 
-    choice = input("Please select an option (1-6): ")
+    choice = input("Please select an option (1-7): ")
 
     switch = {
         '1': calib.main,
@@ -33,11 +35,12 @@ def main():
         '3': lambda: (col.main(), calib.Open_Image("./output/Color_Shape.png")),
         '4': move.main(),
         '5': run_streamlit,
-        '6': lambda: sys.exit("Exiting program. Goodbye!")
+        '6': cells.Run_Cells,
+        '7': lambda: sys.exit("Exiting program. Goodbye!")
 
     }
 
-    func = switch.get(choice, lambda: print("Invalid option. Please select 1-6."))
+    func = switch.get(choice, lambda: print("Invalid option. Please select 1-7."))
 
     try:
         func()
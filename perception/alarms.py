@@ -0,0 +1,160 @@
+"""
+Controller / servo alarm decoding
+
+The alarm tables (Dobot's alarm_controller.json and alarm_servo.json,
+lists of {"id": ..., "en": {"description": ...}} entries) are parsed once
+into id-indexed dicts. Without the files (copy them from the Dobot
+TCP-IP-4Axis-Python repository into perception/files/), alarms are
+reported as "unknown alarm <id>".
+
+AlarmMonitor reacts to the ErrorStatus flag of the feedback stream
+(dobot_controller.error_event): it asks the dashboard for the active
+alarm ids right away and prints their decoded descriptions, while
+WaitArrive returns False instead of running into its timeout.
+"""
+
+import json
+import os
+import re
+import threading
+
+from .dobot_controller import error_event
+
+# ==============================
+# ALARM TABLES
+# ==============================
+
+ALARM_DIR = os.path.join(os.path.dirname(__file__), "files")
+CONTROLLER_ALARMS_PATH = os.path.join(ALARM_DIR, "alarm_controller.json")
+SERVO_ALARMS_PATH = os.path.join(ALARM_DIR, "alarm_servo.json")
+
+SERVO_AXES = 6
+
+_TABLES = {}
+_TABLES_LOCK = threading.Lock()
+
+
+def Index_Alarms(entries):
+    """List of alarm entries → {id: description}"""
+    table = {}
+    for entry in entries:
+        text = entry.get("en", {}).get("description") or entry.get("description", "")
+        table[int(entry["id"])] = text
+    return table
+
+
+def Load_Alarm_Table(path):
+    """
+    Id-indexed alarm table from a JSON file, parsed on the first call
+    only; empty when the file does not exist
+    """
+    with _TABLES_LOCK:
+        if path not in _TABLES:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    _TABLES[path] = Index_Alarms(json.load(f))
+            except FileNotFoundError:
+                print(f"Alarm table {path} not found: alarms are reported by id only")
+                _TABLES[path] = {}
+        return _TABLES[path]
+
+
+def Alarm_Tables():
+    """(controller, servo) alarm tables"""
+    return Load_Alarm_Table(CONTROLLER_ALARMS_PATH), Load_Alarm_Table(SERVO_ALARMS_PATH)
+
+# ==============================
+# DECODING
+# ==============================
+
+def Parse_Error_IDs(reply):
+    """
+    Alarm ids from a GetErrorID reply such as
+    "0,{[[22],[],[],[],[],[],[]]},GetErrorID();"
+
+    Returns:
+        list: [controller ids, J1 servo ids, ..., J6 servo ids]
+    """
+    match = re.search(r"\{(.*)\}", reply or "", re.S)
+    if match is None:
+        return [[] for _ in range(SERVO_AXES + 1)]
+
+    groups = json.loads(match.group(1))
+    groups += [[] for _ in range(SERVO_AXES + 1 - len(groups))]
+    return [[int(i) for i in group] for group in groups]
+
+
+def Decode_Alarms(error_ids):
+    """
+    Args:
+        error_ids: Parse_Error_IDs output
+
+    Returns:
+        list of str, one per active alarm
+    """
+    controller, servo = Alarm_Tables()
+    messages = []
+
+    for alarm_id in error_ids[0]:
+        messages.append(f"Controller alarm {alarm_id}: "
+                        f"{controller.get(alarm_id, f'unknown alarm {alarm_id}')}")
+
+    for axis, ids in enumerate(error_ids[1:], start=1):
+        for alarm_id in ids:
+            messages.append(f"Servo J{axis} alarm {alarm_id}: "
+                            f"{servo.get(alarm_id, f'unknown alarm {alarm_id}')}")
+
+    return messages
+
+
+def Read_Alarms(dashboard):
+    """Active alarms of the robot, decoded (one dashboard round trip)"""
+    return Decode_Alarms(Parse_Error_IDs(dashboard.GetErrorID()))
+
+# ==============================
+# MONITOR
+# ==============================
+
+class AlarmMonitor:
+    """
+    Decode the alarms as soon as the feedback reports an error
+
+    Attributes:
+        alarms: decoded messages of the last error
+    """
+
+    def __init__(self, dashboard):
+        self.dashboard = dashboard
+        self.alarms = []
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="alarms")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not error_event.wait(timeout=0.5):
+                continue
+            if self._stop.is_set():
+                break
+
+            try:
+                self.alarms = Read_Alarms(self.dashboard) or ["Error reported without alarm ids"]
+            except Exception as e:
+                self.alarms = [f"Could not read alarms: {e}"]
+            for message in self.alarms:
+                print(f"*** {message} ***")
+
+            # Wait for ClearError before reporting the next error
+            while error_event.is_set() and not self._stop.is_set():
+                self._stop.wait(0.1)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
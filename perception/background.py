@@ -0,0 +1,187 @@
+"""
+Segmentation models for the grayscale detector
+
+object.filter_image binarizes with a fixed threshold by default. The
+classes here are drop-in replacements (anything with a
+binarize(gray, dst) method) that follow lighting drift:
+
+- OtsuThreshold: Otsu threshold from a downsampled histogram, recomputed
+  every few frames
+- AdaptiveThreshold: local mean threshold
+- BackgroundModel: empty-tray reference learned once, kept up to date
+  with a running average, segmentation by background difference
+
+All of them write objects as 255 on a 0 background, like the original
+THRESH_BINARY_INV (dark parts on a bright tray).
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from .calibration_cache import Undistort_Frame
+from .frame_arena import FrameArena
+
+BACKGROUND_PATH = "output/background.npy"
+
+SEGMENTERS = ("fixed", "otsu", "adaptive", "background")
+DEFAULT_SEGMENTER = "fixed"   # original threshold; the others are opt-in
+
+
+class OtsuThreshold:
+    """
+    Otsu threshold computed on every `step`-th pixel and cached for
+    `every_n` frames
+    """
+
+    def __init__(self, step=4, every_n=10):
+        self.step = step
+        self.every_n = every_n
+        self.threshold = None
+        self._frames = 0
+
+    def compute(self, gray):
+        small = np.ascontiguousarray(gray[::self.step, ::self.step])
+        threshold, _ = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return threshold
+
+    def binarize(self, gray, dst):
+        if self.threshold is None or self._frames % self.every_n == 0:
+            self.threshold = self.compute(gray)
+        self._frames += 1
+
+        cv2.threshold(gray, self.threshold, 255, cv2.THRESH_BINARY_INV, dst=dst)
+        return dst
+
+
+class AdaptiveThreshold:
+    """Local mean threshold, robust to uneven illumination across the tray"""
+
+    def __init__(self, block_size=51, offset=10):
+        self.block_size = block_size
+        self.offset = offset
+
+    def binarize(self, gray, dst):
+        cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV,
+                              self.block_size, self.offset, dst=dst)
+        return dst
+
+
+class BackgroundModel:
+    """
+    Empty-tray reference image with incremental running-average updates
+
+    Args:
+        diff_threshold: minimum |frame - background| for an object pixel
+        alpha: running-average weight of each update
+        update_every: update the reference every N frames (0 = never)
+    """
+
+    def __init__(self, diff_threshold=30, alpha=0.02, update_every=5):
+        self.diff_threshold = diff_threshold
+        self.alpha = alpha
+        self.update_every = update_every
+
+        self.reference = None       # float32 running average
+        self._reference_u8 = None   # cached uint8 copy used for differencing
+        self._frames = 0
+        self._arena = FrameArena()
+
+    def learn(self, frames):
+        """
+        Initialise the reference from one or more empty-tray frames
+        (grayscale or BGR)
+        """
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+
+        acc = None
+        for frame in frames:
+            if frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if acc is None:
+                acc = np.zeros(frame.shape, np.float32)
+            cv2.accumulate(frame, acc)
+
+        self.reference = acc / len(frames)
+        self._reference_u8 = cv2.convertScaleAbs(self.reference)
+        self._frames = 0
+
+    def save(self, path=BACKGROUND_PATH):
+        np.save(path, self.reference)
+
+    @classmethod
+    def load(cls, path=BACKGROUND_PATH, **kwargs):
+        model = cls(**kwargs)
+        if os.path.exists(path):
+            model.reference = np.load(path).astype(np.float32)
+            model._reference_u8 = cv2.convertScaleAbs(model.reference)
+        return model
+
+    def binarize(self, gray, dst):
+        if self.reference is None:
+            raise RuntimeError("Background not learned; call learn() with an empty-tray frame")
+
+        diff = self._arena.get("diff", gray.shape)
+        cv2.absdiff(gray, self._reference_u8, dst=diff)
+        cv2.threshold(diff, self.diff_threshold, 255, cv2.THRESH_BINARY, dst=dst)
+
+        self._frames += 1
+        if self.update_every and self._frames % self.update_every == 0:
+            self.update(gray, dst)
+
+        return dst
+
+    def update(self, gray, object_mask):
+        """Blend the frame into the reference, except where objects are"""
+        background_mask = self._arena.get("background_mask", gray.shape)
+        cv2.bitwise_not(object_mask, dst=background_mask)
+
+        cv2.accumulateWeighted(gray, self.reference, self.alpha, mask=background_mask)
+        cv2.convertScaleAbs(self.reference, dst=self._reference_u8)
+
+
+def Learn_Background(camera_index=1, num_frames=10, path=BACKGROUND_PATH):
+    """Average a few frames of the empty tray and save the reference"""
+    cap = cv2.VideoCapture(camera_index)
+    if not cap.isOpened():
+        print("Error: Could not open camera.")
+        return None
+
+    frames = []
+    try:
+        while len(frames) < num_frames:
+            ret, frame = cap.read()
+            if not ret:
+                print("Failed to grab frame")
+                return None
+            # Same geometry as the frames it will be compared with
+            frames.append(Undistort_Frame(frame).copy())
+    finally:
+        cap.release()
+
+    model = BackgroundModel()
+    model.learn(frames)
+    model.save(path)
+    print(f"Background saved as {path}")
+    return model
+
+
+def Make_Segmenter(name=DEFAULT_SEGMENTER, path=BACKGROUND_PATH):
+    """
+    Segmenter for object.filter_image by name (see SEGMENTERS); "fixed"
+    returns None, the original fixed threshold. "background" needs a
+    reference saved by Learn_Background.
+    """
+    if name == "fixed":
+        return None
+    if name == "otsu":
+        return OtsuThreshold()
+    if name == "adaptive":
+        return AdaptiveThreshold()
+    if name == "background":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found! Run Learn_Background with an empty tray first.")
+        return BackgroundModel.load(path)
+    raise ValueError(f"Unknown segmenter {name!r}, expected one of {SEGMENTERS}")
@@ -0,0 +1,197 @@
+"""
+Micro-benchmarks for the perception pipeline
+
+Run from the project root:
+    python -m perception.benchmark
+"""
+
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from . import shape
+from .classifier import RULE_ENGINE, KnnEngine, Load_Training_Set
+from .frame_arena import FrameArena
+
+
+# ===============================
+# Helpers
+# ===============================
+
+def Measure(func, repeats=50):
+    """
+    Time func() and measure the memory it allocates per call
+
+    numpy (and therefore every OpenCV output array) reports its buffers
+    to tracemalloc, so the traced peak is the transient allocation cost
+    of one call.
+
+    Returns:
+        tuple: (mean latency in ms, peak bytes allocated per call)
+    """
+    func()  # warm-up (fills reusable buffers)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    latency_ms = (time.perf_counter() - start) * 1000 / repeats
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return latency_ms, peak - baseline
+
+
+def Print_Results(title, results):
+    print(f"\n{title}")
+    print(f"{'variant':<24}{'ms/frame':>10}{'alloc KiB':>12}")
+    for name, (latency_ms, size) in results.items():
+        print(f"{name:<24}{latency_ms:>10.3f}{size / 1024:>12.1f}")
+
+
+# ===============================
+# Preprocessing
+# ===============================
+
+def Legacy_Preprocess(image):
+    blurred = cv2.GaussianBlur(image, (7, 7), 0)
+    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+
+    h, s, v = cv2.split(hsv)
+    v = cv2.threshold(v, 240, 240, cv2.THRESH_TRUNC)[1]
+    return cv2.merge([h, s, v])
+
+
+def Benchmark_Preprocess(image, repeats=50):
+
+    arena = FrameArena()
+
+    results = {
+        "split/merge (legacy)": Measure(lambda: Legacy_Preprocess(image), repeats),
+    }
+    for blur in ("gaussian", "separable", "box"):
+        results[f"buffered {blur}"] = Measure(
+            lambda: shape.Preprocess_HSV(image, blur, arena), repeats)
+
+    Print_Results(f"Preprocessing {image.shape[1]}x{image.shape[0]}", results)
+    return results
+
+
+# ===============================
+# Detection
+# ===============================
+
+def Benchmark_Detect(image, repeats=20):
+
+    arena = FrameArena()
+
+    results = {
+        "fresh buffers": Measure(
+            lambda: shape.Detect_Objects(image, arena=FrameArena()), repeats),
+        "persistent arena": Measure(
+            lambda: shape.Detect_Objects(image, arena=arena), repeats),
+    }
+
+    Print_Results(f"Detect_Objects {image.shape[1]}x{image.shape[0]}", results)
+    return results
+
+
+def Benchmark_Masks(image, repeats=20):
+
+    arena = FrameArena()
+    hsv = shape.Preprocess_HSV(image, arena=arena)
+    colors = list(shape.COLOR_RANGES.keys())
+
+    results = {
+        f"mask {color}": Measure(
+            lambda color=color: shape.Find_Color_Contours(hsv, color, arena), repeats)
+        for color in colors
+    }
+
+    opencv_threads = cv2.getNumThreads()
+
+    shape.Configure_Mask_Pool(workers=1, opencv_threads=0)
+    results["all colors, sequential"] = Measure(
+        lambda: [shape.Find_Color_Contours(hsv, c, arena) for c in colors], repeats)
+
+    shape.Configure_Mask_Pool(opencv_threads="auto")
+    results["all colors, thread pool"] = Measure(
+        lambda: shape.Find_Contours_Parallel(hsv, colors, arena), repeats)
+
+    cv2.setNumThreads(opencv_threads)
+
+    Print_Results(f"Mask stage {image.shape[1]}x{image.shape[0]}", results)
+    return results
+
+
+# ===============================
+# Classifier Engines
+# ===============================
+
+def Benchmark_Classifiers(data=None, k=5, holdout=0.3, repeats=50, seed=0):
+    """
+    Throughput and accuracy of the rule engine vs a k-NN engine trained
+    on the rest of the labeled archive rows
+
+    data: Load_Training_Set() layout, default: the archived runs
+    """
+    if data is None:
+        data = Load_Training_Set()
+
+    count = len(data["features"])
+    order = np.random.RandomState(seed).permutation(count)
+    n_test = max(1, int(count * holdout))
+    test, train = order[:n_test], order[n_test:]
+
+    knn = KnnEngine(k).fit(data["features"][train], data["color_stats"][train],
+                           data["color"][train], data["shape"][train])
+
+    args = (data["features"][test], data["color_stats"][test], data["mask_color"][test])
+
+    print(f"\nClassifier engines ({len(train)} train / {n_test} test rows)")
+    print(f"{'engine':<12}{'ms/batch':>10}{'objects/s':>12}{'color acc':>11}{'shape acc':>11}")
+
+    results = {}
+    for name, engine in (("rules", RULE_ENGINE), (f"knn k={k}", knn)):
+        latency_ms, _ = Measure(lambda: engine.classify(*args), repeats)
+        colors, shapes = engine.classify(*args)
+        color_acc = np.mean(colors == data["color"][test])
+        shape_acc = np.mean(shapes == data["shape"][test])
+
+        results[name] = (latency_ms, color_acc, shape_acc)
+        print(f"{name:<12}{latency_ms:>10.3f}{n_test / latency_ms * 1000:>12.0f}"
+              f"{color_acc:>11.1%}{shape_acc:>11.1%}")
+
+    return results
+
+
+# ===============================
+# Main Program
+# ===============================
+
+def main():
+
+    image = cv2.imread("./output/captured_img.png")
+
+    if image is None:
+        print("Image not found.")
+        return
+
+    Benchmark_Preprocess(image)
+    Benchmark_Preprocess(cv2.resize(image, None, fx=3, fy=3))
+    Benchmark_Detect(image)
+    Benchmark_Masks(cv2.resize(image, None, fx=3, fy=3))
+
+    try:
+        Benchmark_Classifiers()
+    except FileNotFoundError as e:
+        print(f"\nClassifier engines skipped: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Calibration cache
+
+Keeps the pixel -> robot homography (and its inverse), the lens
+undistortion maps and the baked pixel -> world lookup map in memory and
+reloads them only when their files actually change, so long-lived
+processes such as the Streamlit UI pick up a recalibration without
+re-parsing the files on every detection.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+H_MATRIX_PATH = "output/H_matrix.json"
+UNDISTORT_MAPS_PATH = "output/undistort_maps.npz"
+PIXEL_MAP_PATH = "output/pixel_world_map.npy"
+PIXEL_MAP_META_PATH = "output/pixel_world_map.json"
+
+
+class CalibrationCache:
+    """
+    Homography loaded from a JSON file, invalidated by mtime/size and
+    confirmed by content hash
+
+    Attributes:
+        version: incremented every time a different matrix is loaded
+    """
+
+    def __init__(self, path=H_MATRIX_PATH, check_interval=0.5):
+        """
+        Args:
+            path: JSON file holding the 3x3 matrix as nested lists
+            check_interval: minimum seconds between two stat() calls
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+
+        self._H = None
+        self._H_inv = None
+        self._stamp = None
+        self._digest = None
+        self._last_check = -np.inf
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval and self._H is not None:
+            return
+        self._last_check = now
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._H is None:
+                raise FileNotFoundError(f"{self.path} not found! Run calibration first.")
+            return  # keep the last good calibration
+
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+
+        with open(self.path, "rb") as f:
+            raw = f.read()
+
+        digest = hashlib.sha1(raw).hexdigest()
+        if digest == self._digest:
+            self._stamp = stamp  # touched, not changed
+            return
+
+        try:
+            H = np.array(json.loads(raw), dtype=np.float64).reshape(3, 3)
+        except ValueError:
+            # Caught mid-write by a non-atomic writer; retry next check
+            if self._H is None:
+                raise
+            return
+
+        self._H = H
+        self._H_inv = np.linalg.inv(H)
+        self._stamp = stamp
+        self._digest = digest
+        self.version += 1
+
+    def digest(self):
+        """SHA-1 of the loaded H_matrix.json content"""
+        with self._lock:
+            self._refresh()
+            return self._digest
+
+    def get(self):
+        """Return the current homography (3x3 float64, do not modify)"""
+        with self._lock:
+            self._refresh()
+            return self._H
+
+    def inverse(self):
+        """Return the robot -> pixel homography"""
+        with self._lock:
+            self._refresh()
+            return self._H_inv
+
+    def invalidate(self):
+        """Force a reload check on the next access"""
+        with self._lock:
+            self._last_check = -np.inf
+            self._stamp = None
+
+
+class UndistortMaps:
+    """
+    initUndistortRectifyMap tables written by Calibration_App.Calibrate_Camera,
+    reloaded when the file changes. Without a maps file frames pass through.
+    """
+
+    def __init__(self, path=UNDISTORT_MAPS_PATH, check_interval=0.5):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+
+        self._maps = None
+        self._stamp = None
+        self._last_check = -np.inf
+        self._warned = False
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._maps = None
+            self._stamp = None
+            return
+
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+
+        with np.load(self.path) as data:
+            self._maps = (data["map1"], data["map2"])
+        self._stamp = stamp
+        self.version += 1
+
+    def get(self):
+        """Return (map1, map2) or None when the lens is not calibrated"""
+        with self._lock:
+            self._refresh()
+            return self._maps
+
+    def remap(self, frame, dst=None):
+        """
+        Undistort a frame with a single cv2.remap pass
+
+        Returns frame unchanged when no maps are available or the frame
+        size does not match the calibration.
+        """
+        maps = self.get()
+        if maps is None or maps[0].shape[:2] != frame.shape[:2]:
+            return frame
+
+        return cv2.remap(frame, maps[0], maps[1], cv2.INTER_LINEAR, dst=dst)
+
+
+class PixelWorldMap:
+    """
+    Dense raw-pixel -> robot XY table baked by Calibration_App, memory-mapped
+    from disk and sampled with bilinear interpolation. It already includes
+    lens undistortion, so frames converted through it must not be remapped.
+    """
+
+    def __init__(self, path=PIXEL_MAP_PATH, meta_path=PIXEL_MAP_META_PATH, check_interval=0.5):
+        self.path = path
+        self.meta_path = meta_path
+        self.check_interval = check_interval
+
+        self._map = None
+        self._meta = None
+        self._stamp = None
+        self._last_check = -np.inf
+        self._warned = False
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            stamp = tuple((st.st_mtime_ns, st.st_size)
+                          for st in (os.stat(self.path), os.stat(self.meta_path)))
+        except FileNotFoundError:
+            self._map = self._meta = self._stamp = None
+            return
+
+        if stamp == self._stamp:
+            return
+
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            table = np.load(self.path, mmap_mode="r")
+        except ValueError:
+            return  # caught mid-write by an older writer; retry next check
+
+        self._meta = meta
+        self._map = table
+        self._stamp = stamp
+
+    def get(self, image_size):
+        """
+        Return (table, step) if a map matching the current H_matrix.json
+        and image_size = (width, height) exists, else None
+        """
+        with self._lock:
+            self._refresh()
+            if self._map is None:
+                return None
+            meta = self._meta
+
+        if meta.get("h_matrix_sha1") != H_CACHE.digest():
+            return None  # baked for an older calibration
+        if image_size is None:
+            if not self._warned:
+                print(f"Warning: pixel -> world map (built for {meta['image_size']}) skipped, "
+                      "no image size given; using the homography")
+                self._warned = True
+            return None
+        if tuple(meta["image_size"]) != tuple(image_size):
+            return None
+
+        return self._map, meta["step"]
+
+
+def Sample_Map(table, step, points):
+    """
+    Bilinear lookup of (N, 2) pixel coordinates in a (rows, cols, 2) table
+    sampled every `step` pixels; points outside are clamped to the border
+    """
+    rows, cols = table.shape[:2]
+
+    g = np.asarray(points, dtype=np.float64) / step
+    gx = np.clip(g[:, 0], 0, cols - 1)
+    gy = np.clip(g[:, 1], 0, rows - 1)
+
+    x0 = np.minimum(gx.astype(np.intp), cols - 2 if cols > 1 else 0)
+    y0 = np.minimum(gy.astype(np.intp), rows - 2 if rows > 1 else 0)
+    x1 = np.minimum(x0 + 1, cols - 1)
+    y1 = np.minimum(y0 + 1, rows - 1)
+    fx = (gx - x0)[:, None]
+    fy = (gy - y0)[:, None]
+
+    top = table[y0, x0] * (1 - fx) + table[y0, x1] * fx
+    bottom = table[y1, x0] * (1 - fx) + table[y1, x1] * fx
+
+    return top * (1 - fy) + bottom * fy
+
+
+# Process-wide caches of the default calibration files
+H_CACHE = CalibrationCache()
+UNDISTORT = UndistortMaps()
+PIXEL_MAP = PixelWorldMap()
+
+
+def Get_H_Matrix():
+    return H_CACHE.get()
+
+
+def Undistort_Frame(frame, dst=None):
+    """
+    Undistort a frame for detection. When the pixel -> world map exists
+    it models the distortion itself, so the frame is returned unchanged.
+    """
+    if PIXEL_MAP.get((frame.shape[1], frame.shape[0])) is not None:
+        return frame
+
+    return UNDISTORT.remap(frame, dst)
+
+
+def Pixel_To_World_Batch(points, image_size=None):
+    """
+    Convert (N, 2) pixel coordinates to (N, 2) robot XY in one pass:
+    a gather from the baked pixel map when available, else the homography
+
+    Args:
+        points: array-like of (u, v) pixel coordinates
+        image_size: (width, height) of the frame the points come from;
+                    required for the pixel map, which is only valid at the
+                    resolution it was baked for
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+    pixel_map = PIXEL_MAP.get(image_size)
+    if pixel_map is not None:
+        return Sample_Map(pixel_map[0], pixel_map[1], points)
+
+    if len(points) == 0:
+        return points.copy()
+    return cv2.perspectiveTransform(points.reshape(-1, 1, 2), H_CACHE.get()).reshape(-1, 2)
+
+
+def World_To_Pixel_Batch(points):
+    """
+    Convert (N, 2) robot XY to (N, 2) pixel coordinates of the undistorted
+    frame through the inverse homography (approximate for raw frames when
+    the baked pixel map is in use)
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return points.copy()
+    return cv2.perspectiveTransform(points.reshape(-1, 1, 2), H_CACHE.inverse()).reshape(-1, 2)
@@ -0,0 +1,260 @@
+"""
+Color/shape classifier engines
+
+shape.Build_Objects hands all candidate contours of a frame to an engine
+in one call:
+
+    colors, shapes = engine.classify(features, color_stats, mask_colors)
+
+- features: shape_features.Extract_Features table of the candidates
+- color_stats: Color_Stats rows (None unless engine.uses_color_stats)
+- mask_colors: name of the COLOR_RANGES mask each contour came from
+
+RuleEngine is the original behaviour (mask color, Classify_Shapes rules).
+KnnEngine is a cv2.ml.KNearest model over contour features and HSV
+statistics, trained offline from archived, labeled detection runs.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from .frame_arena import FrameArena
+from .results_store import List_Runs
+from .shape_features import F, Classify_Shapes
+
+MODEL_PATH = "output/classifier_knn.npz"
+
+HUE_BINS = 8
+
+COLOR_STAT_COLUMNS = ("hue_cos", "hue_sin", "saturation", "value") + \
+    tuple(f"hue_hist{i}" for i in range(HUE_BINS))
+
+# Feature table columns the learned engine looks at
+INPUT_FEATURES = ("circularity", "solidity", "aspect_ratio", "approx_aspect", "vertices")
+
+# ===============================
+# Color Statistics
+# ===============================
+
+def Color_Stats(hsv, contours, offset=(0, 0), arena=None):
+    """
+    Mean hue (as a unit vector), saturation, value and a normalized hue
+    histogram inside each contour
+
+    Each contour is filled into its own bounding-box slice of one uint8
+    mask, so overlapping candidates keep all of their pixels.
+
+    offset: subtracted from the contour points (contours found with an
+            ROI offset but hsv being that ROI)
+    arena: optional FrameArena holding the mask buffer
+
+    Returns:
+        np.ndarray: (N, len(COLOR_STAT_COLUMNS)) float64
+    """
+    count = len(contours)
+    stats = np.zeros((count, len(COLOR_STAT_COLUMNS)), dtype=np.float64)
+    if count == 0:
+        return stats
+
+    if arena is None:
+        arena = FrameArena()
+
+    height, width = hsv.shape[:2]
+    mask = arena.get("color_stats_mask", (height, width))
+
+    for i, contour in enumerate(contours):
+        x, y, w, h = cv2.boundingRect(contour)
+        x0, y0 = max(x - offset[0], 0), max(y - offset[1], 0)
+        x1, y1 = min(x - offset[0] + w, width), min(y - offset[1] + h, height)
+        if x1 <= x0 or y1 <= y0:
+            continue
+
+        roi = mask[y0:y1, x0:x1]
+        roi[:] = 0
+        cv2.drawContours(roi, [contour], -1, 255, -1,
+                         offset=(-offset[0] - x0, -offset[1] - y0))
+
+        pixels = hsv[y0:y1, x0:x1][roi > 0].astype(np.float64)
+        if len(pixels) == 0:
+            continue
+
+        angle = pixels[:, 0] * (np.pi / 90.0)  # OpenCV hue is 0..180
+        stats[i, 0] = np.cos(angle).mean()
+        stats[i, 1] = np.sin(angle).mean()
+        stats[i, 2] = pixels[:, 1].mean() / 255.0
+        stats[i, 3] = pixels[:, 2].mean() / 255.0
+
+        hue_bin = np.minimum(pixels[:, 0] * HUE_BINS / 180.0, HUE_BINS - 1).astype(np.intp)
+        stats[i, 4:] = np.bincount(hue_bin, minlength=HUE_BINS) / len(pixels)
+
+    return stats
+
+    labels = np.zeros(hsv.shape[:2], dtype=np.int32)
+    for i, contour in enumerate(contours):
+        cv2.drawContours(labels, [contour], -1, i + 1, -1,
+                         offset=(-offset[0], -offset[1]))
+
+    inside = labels > 0
+    index = labels[inside] - 1
+    pixels = hsv[inside].astype(np.float64)
+
+    n = np.bincount(index, minlength=count)
+    n_safe = np.maximum(n, 1)[:, None]
+
+    angle = pixels[:, 0] * (np.pi / 90.0)  # OpenCV hue is 0..180
+    sums = np.stack([
+        np.bincount(index, np.cos(angle), count),
+        np.bincount(index, np.sin(angle), count),
+        np.bincount(index, pixels[:, 1], count) / 255.0,
+        np.bincount(index, pixels[:, 2], count) / 255.0,
+    ], axis=1)
+    stats[:, :4] = sums / n_safe
+
+    hue_bin = np.minimum(pixels[:, 0] * HUE_BINS / 180.0, HUE_BINS - 1).astype(np.intp)
+    hist = np.bincount(index * HUE_BINS + hue_bin, minlength=count * HUE_BINS)
+    stats[:, 4:] = hist.reshape(count, HUE_BINS) / n_safe
+
+    return stats
+
+# ===============================
+# Rule Engine
+# ===============================
+
+class RuleEngine:
+    """Mask color plus the Classify_Shapes decision table"""
+
+    uses_color_stats = False
+
+    def classify(self, features, color_stats, mask_colors):
+        return np.asarray(mask_colors, dtype="U16"), Classify_Shapes(features)
+
+RULE_ENGINE = RuleEngine()
+
+# ===============================
+# k-NN Engine
+# ===============================
+
+def Engine_Inputs(features, color_stats):
+    """Model input rows: shape features, log area and color statistics"""
+    shape_part = features[:, [F[name] for name in INPUT_FEATURES]]
+    log_area = np.log1p(features[:, F["area"]])[:, None]
+
+    return np.hstack([shape_part, log_area, color_stats]).astype(np.float32)
+
+
+class KnnEngine:
+    """
+    Two cv2.ml.KNearest models (color, shape) on standardized inputs
+    """
+
+    uses_color_stats = True
+
+    def __init__(self, k=5):
+        self.k = k
+        self.mean = None
+        self.std = None
+        self.color_names = None
+        self.shape_names = None
+        self._samples = None
+        self._color_labels = None
+        self._shape_labels = None
+        self._color_model = None
+        self._shape_model = None
+
+    def fit(self, features, color_stats, colors, shapes):
+        samples = Engine_Inputs(features, color_stats)
+        self.mean = samples.mean(axis=0)
+        self.std = samples.std(axis=0) + 1e-6
+
+        self.color_names, color_labels = np.unique(np.asarray(colors, dtype="U16"),
+                                                   return_inverse=True)
+        self.shape_names, shape_labels = np.unique(np.asarray(shapes, dtype="U16"),
+                                                   return_inverse=True)
+        self._samples = (samples - self.mean) / self.std
+        self._color_labels = color_labels.astype(np.float32)
+        self._shape_labels = shape_labels.astype(np.float32)
+        self._train()
+        return self
+
+    def _train(self):
+        self._color_model = cv2.ml.KNearest_create()
+        self._color_model.train(self._samples, cv2.ml.ROW_SAMPLE, self._color_labels)
+        self._shape_model = cv2.ml.KNearest_create()
+        self._shape_model.train(self._samples, cv2.ml.ROW_SAMPLE, self._shape_labels)
+
+    def classify(self, features, color_stats, mask_colors):
+        if len(features) == 0:
+            return np.empty(0, dtype="U16"), np.empty(0, dtype="U16")
+
+        samples = (Engine_Inputs(features, color_stats) - self.mean) / self.std
+        k = min(self.k, len(self._samples))
+
+        _, colors, _, _ = self._color_model.findNearest(samples, k)
+        _, shapes, _, _ = self._shape_model.findNearest(samples, k)
+
+        return (self.color_names[colors[:, 0].astype(np.intp)],
+                self.shape_names[shapes[:, 0].astype(np.intp)])
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, k=self.k, mean=self.mean, std=self.std,
+                 color_names=self.color_names, shape_names=self.shape_names,
+                 samples=self._samples, color_labels=self._color_labels,
+                 shape_labels=self._shape_labels)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with np.load(path) as data:
+            engine = cls(int(data["k"]))
+            engine.mean = data["mean"]
+            engine.std = data["std"]
+            engine.color_names = data["color_names"]
+            engine.shape_names = data["shape_names"]
+            engine._samples = data["samples"]
+            engine._color_labels = data["color_labels"]
+            engine._shape_labels = data["shape_labels"]
+        engine._train()
+        return engine
+
+# ===============================
+# Training Data
+# ===============================
+
+def Load_Training_Set(kind="shape", limit=1000):
+    """
+    Concatenate the archived runs that carry features (saved with
+    shape.Save_World_Coordinates(..., archive=True)); their color/shape
+    columns are the labels, so correct them in the archive before training.
+
+    Returns:
+        dict: features, color_stats, mask_color, color, shape arrays
+    """
+    parts = {"features": [], "color_stats": [], "mask_color": [], "color": [], "shape": []}
+
+    for run_id, _, _, _, count, archive in List_Runs(kind, limit):
+        if not archive or count == 0 or not os.path.exists(archive):
+            continue
+        with np.load(archive) as data:
+            if not {"features", "color_stats"} <= set(data.files):
+                continue
+            for name in parts:
+                parts[name].append(data[name])
+
+    if not parts["features"]:
+        raise FileNotFoundError("No archived runs with features; save runs with archive=True")
+
+    return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+
+def Train_Knn(kind="shape", k=5, path=MODEL_PATH):
+    data = Load_Training_Set(kind)
+    engine = KnnEngine(k).fit(data["features"], data["color_stats"], data["color"], data["shape"])
+    engine.save(path)
+    print(f"Trained k-NN classifier on {len(data['features'])} samples → {path}")
+    return engine
+
+
+if __name__ == "__main__":
+    Train_Knn()
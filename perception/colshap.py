@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 import json
 
+from .shape_features import F, Classify_Shapes, Extract_Features
+
 # ===============================
 # Global Variables
 # ===============================
@@ -50,28 +52,16 @@ def Create_Color_Mask(hsv, color):
 # Shape Classification
 # ===============================
 
-def Classify_Shape(contour):
-
-    perimeter = cv2.arcLength(contour, True)
-    approx = cv2.approxPolyDP(contour, 0.02 * perimeter, True)
-    vertices = len(approx)
-
-    area = cv2.contourArea(contour)
-    circularity = 4 * np.pi * area / (perimeter ** 2) if perimeter > 0 else 0
-
-    x, y, w, h = cv2.boundingRect(contour)
-    aspect_ratio = w / h if h > 0 else 0
-
-    if circularity > 0.85:
-        return "circle"
-
-    if vertices == 3:
-        return "triangle"
+# Thresholds of this detector (shape.py uses its own defaults)
+SHAPE_RULES = {
+    "circularity": (0.85, np.inf),
+    "square_aspect": (0.8, 1.2),
+    "aspect_column": "aspect_ratio",
+}
 
-    if vertices == 4:
-        return "square" if 0.8 <= aspect_ratio <= 1.2 else "rectangle"
+def Classify_Shape(contour):
 
-    return "polygon"
+    return str(Classify_Shapes(Extract_Features([contour]), **SHAPE_RULES)[0])
 
 # ===============================
 # Detect Objects
@@ -98,42 +88,31 @@ def Detect_Objects(image, color_filter=None, shape_filter=None):
         mask = Create_Color_Mask(hsv, color_name)
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-        for contour in contours:
+        features = Extract_Features(contours, area_range=(MIN_AREA, MAX_AREA))
+        area = features[:, F["area"]]
+        aspect = features[:, F["aspect_ratio"]]
 
-            area = cv2.contourArea(contour)
-            if not (MIN_AREA < area < MAX_AREA):
-                continue
+        keep = (MIN_AREA < area) & (area < MAX_AREA) & (features[:, F["m00"]] != 0) & \
+               (0.2 < aspect) & (aspect < 5.0) & (features[:, F["solidity"]] >= 0.85)
+        shapes = Classify_Shapes(features, **SHAPE_RULES)
 
-            M = cv2.moments(contour)
-            if M["m00"] == 0:
-                continue
+        if shape_filter and shape_filter != "any":
+            keep &= shapes == shape_filter
 
-            cx = int(M["m10"] / M["m00"])
-            cy = int(M["m01"] / M["m00"])
+        for i in np.flatnonzero(keep):
 
-            if any(np.hypot(cx - x, cy - y) < 30 for x, y in detected_centers):
-                continue
-
-            x, y, w, h = cv2.boundingRect(contour)
-            if h == 0 or not (0.2 < w / h < 5.0):
-                continue
+            cx = int(features[i, F["cx"]])
+            cy = int(features[i, F["cy"]])
 
-            hull = cv2.convexHull(contour)
-            hull_area = cv2.contourArea(hull)
-            if hull_area == 0 or area / hull_area < 0.85:
-                continue
-
-            shape = Classify_Shape(contour)
-
-            if shape_filter and shape_filter != "any" and shape != shape_filter:
+            if any(np.hypot(cx - x, cy - y) < 30 for x, y in detected_centers):
                 continue
 
             objects.append({
                 "center": (cx, cy),
                 "color": color_name,
-                "shape": shape,
-                "area": area,
-                "contour": contour
+                "shape": str(shapes[i]),
+                "area": float(area[i]),
+                "contour": contours[i]
             })
 
             detected_centers.append((cx, cy))
@@ -0,0 +1,301 @@
+"""
+Conveyor tracking: picking parts from a moving belt
+
+The vision process (shm_bus.Run_Vision_Process) publishes detections with
+the capture time of their frame. BeltEstimator follows the parts from one
+detection set to the next and estimates the belt velocity in robot
+coordinates; Predict_Intercept then places the pick where the part will be
+when the cup gets there, from the estimated motion time of the approach.
+
+For bench tests without a belt, Synthetic_Belt_Video records a moving
+scene that Run_Vision_Process can replay in place of the camera.
+"""
+
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from .dobot_controller import GetCurrentPosition
+from .motion_planner import Plan_Pick_Cycle, Execute_Plan, VACUUM_DWELL
+from .motion_profiles import Apply_Profiles, Load_Profiles, Profile_Ratios, Estimate_Move_Time
+from .mg400_kinematics import Check_Targets
+from .robot_move import PICK_Z, SAFE_Z_OFFSET, DROP_POINT, DROP_POINT_UP, PART_WEIGHT
+from .shm_bus import VisionProcess
+
+# ==============================
+# CONFIGURATION
+# ==============================
+
+MATCH_RADIUS = 25.0            # mm, gate between a part and its predicted position
+VELOCITY_SMOOTHING = 0.3       # weight of each new velocity measurement
+MIN_VELOCITY_SAMPLES = 5       # matched frame pairs before picking starts
+COMMAND_LATENCY = 0.015        # s, command round trip until the arm starts moving
+
+# ==============================
+# BELT VELOCITY
+# ==============================
+
+class BeltEstimator:
+    """
+    Belt velocity (mm/s, robot XY) from consecutive timestamped detections
+
+    Parts are associated frame to frame by nearest neighbour against their
+    position predicted with the current velocity; the median displacement
+    of the matches is smoothed into the estimate.
+    """
+
+    def __init__(self, match_radius=MATCH_RADIUS, smoothing=VELOCITY_SMOOTHING):
+        self.match_radius = match_radius
+        self.smoothing = smoothing
+        self.velocity = np.zeros(2)
+        self.samples = 0
+
+        self._points = None
+        self._time = None
+
+    def update(self, points, t):
+        """
+        Args:
+            points: (N, 2) part positions in robot XY
+            t: capture time of the frame they were seen in (s)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+        if self._points is not None and len(points) and len(self._points) and t > self._time:
+            dt = t - self._time
+            predicted = self._points + self.velocity * dt
+
+            dist = np.linalg.norm(points[:, None, :] - predicted[None, :, :], axis=2)
+            nearest = dist.argmin(axis=1)
+            matched = dist[np.arange(len(points)), nearest] < self.match_radius
+
+            if matched.any():
+                measured = np.median((points[matched] - self._points[nearest[matched]]) / dt, axis=0)
+                alpha = 1.0 if self.samples == 0 else self.smoothing
+                self.velocity = (1 - alpha) * self.velocity + alpha * measured
+                self.samples += 1
+
+        self._points = points
+        self._time = t
+        return self.velocity
+
+    def predict(self, points, t_capture, t):
+        """Positions at time t of parts seen at t_capture"""
+        return np.asarray(points, dtype=np.float64) + self.velocity * (t - t_capture)
+
+# ==============================
+# INTERCEPT
+# ==============================
+
+def Pick_Time(pose, high, low, profiles, payload_g=0.0):
+    """
+    Seconds from command to the cup touching the part: approach, vacuum
+    dwell at the approach point, descent
+    """
+    return (COMMAND_LATENCY
+            + Estimate_Move_Time(pose, high, *Profile_Ratios("transit", payload_g, profiles))
+            + VACUUM_DWELL
+            + Estimate_Move_Time(high, low, *Profile_Ratios("descent", payload_g, profiles)))
+
+
+def Predict_Intercept(point, r, t_capture, estimator, pose, now, profiles, iterations=3):
+    """
+    Fixed-point iteration: the motion time depends on the target, the
+    target on the motion time
+
+    Returns:
+        tuple: (high point, low point, predicted contact time)
+    """
+    target = np.asarray(point, dtype=np.float64)
+    contact = now
+
+    def poses(target):
+        x, y = float(target[0]), float(target[1])
+        return [x, y, PICK_Z + SAFE_Z_OFFSET, r], [x, y, PICK_Z, r]
+
+    for _ in range(iterations):
+        high, low = poses(target)
+        contact = now + Pick_Time(pose, high, low, profiles)
+        target = estimator.predict(point, t_capture, contact)
+
+    # Poses at the part's position for the last contact time
+    high, low = poses(target)
+    return high, low, contact
+
+
+def In_Reach(high, low):
+    return bool(Check_Targets([(high, low)])[0])
+
+# ==============================
+# LATENCY
+# ==============================
+
+class LatencyLog:
+    """
+    Capture → detection → read → command timestamps (monotonic ns) of the
+    last picks, reported as p50 / p95 per stage
+    """
+
+    STAGES = ("detect", "bus", "plan", "total")
+
+    def __init__(self, size=1000):
+        self.rows = deque(maxlen=size)
+
+    def record(self, capture_ns, published_ns, read_ns, command_ns):
+        self.rows.append((published_ns - capture_ns, read_ns - published_ns,
+                          command_ns - read_ns, command_ns - capture_ns))
+
+    def summary(self):
+        if not self.rows:
+            return {}
+        ms = np.array(self.rows, dtype=np.float64) / 1e6
+        return {stage: (float(np.percentile(ms[:, i], 50)), float(np.percentile(ms[:, i], 95)))
+                for i, stage in enumerate(self.STAGES)}
+
+    def print_summary(self):
+        print(f"{'stage':<8}{'p50 ms':>9}{'p95 ms':>9}")
+        for stage, (p50, p95) in self.summary().items():
+            print(f"{stage:<8}{p50:>9.2f}{p95:>9.2f}")
+
+# ==============================
+# PICK LOOP
+# ==============================
+
+def Run_Conveyor_Picking(move, dashboard, bus, color=None, shape=None, max_picks=None,
+                         stop_event=None, payload_g=PART_WEIGHT):
+    """
+    Pick matching parts off the belt at their predicted intercept
+
+    Args:
+        move, dashboard: connected robot API objects (feedback thread running)
+        bus: shm_bus.DetectionBus fed by Run_Vision_Process
+        color, shape: optional filters
+        max_picks: stop after this many picks
+        stop_event: threading/multiprocessing Event ending the loop
+
+    Returns:
+        LatencyLog of the issued picks
+    """
+    estimator = BeltEstimator()
+    latency = LatencyLog()
+    profiles = Load_Profiles()
+    last_seq = -1
+    picks = 0
+
+    while stop_event is None or not stop_event.is_set():
+        if max_picks is not None and picks >= max_picks:
+            break
+
+        seq, det = bus.read_detections()
+        if seq == last_seq or det["capture_ns"] < 0:
+            time.sleep(0.001)
+            continue
+        last_seq = seq
+        read_ns = time.monotonic_ns()
+
+        t_capture = det["capture_ns"] * 1e-9
+        points = np.column_stack([det["X"], det["Y"]])
+        estimator.update(points, t_capture)
+        if estimator.samples < MIN_VELOCITY_SAMPLES:
+            continue
+
+        pose = GetCurrentPosition()
+        if pose is None:
+            continue
+
+        selected = np.ones(len(points), dtype=bool)
+        if color is not None:
+            selected &= det["color"] == color
+        if shape is not None:
+            selected &= det["shape"] == shape
+
+        # Most downstream part first: it leaves the workspace soonest
+        downstream = points @ estimator.velocity
+        now = time.monotonic()
+
+        for i in np.flatnonzero(selected)[np.argsort(-downstream[selected])]:
+            high, low, _ = Predict_Intercept(points[i], float(det["R"][i]), t_capture,
+                                             estimator, pose, now, profiles)
+            if not In_Reach(high, low):
+                continue
+
+            # Switch the vacuum on above the part, then drop straight onto it
+            plan = Plan_Pick_Cycle(high, low, DROP_POINT_UP, DROP_POINT)
+            plan[0] = plan[0]._replace(cp=0, wait=True, vacuum=1)
+            plan[1] = plan[1]._replace(vacuum=None)
+            plan = Apply_Profiles(plan, payload_g, profiles)
+
+            latency.record(det["capture_ns"], det["timestamp_ns"], read_ns, time.monotonic_ns())
+            if not Execute_Plan(move, dashboard, plan):
+                return latency
+            picks += 1
+            break
+
+    latency.print_summary()
+    return latency
+
+
+def Run_Conveyor(move, dashboard, camera_index=1, color=None, shape=None, max_picks=None,
+                 stop_event=None):
+    """
+    Start the vision process on a shared-memory bus and pick from the belt
+    with Run_Conveyor_Picking until max_picks or stop_event
+
+    Returns:
+        LatencyLog of the issued picks, None if no detections arrived
+    """
+    vision = VisionProcess(camera_index).start()
+    try:
+        if not vision.wait_detections():
+            print("Vision process did not publish any detections")
+            return None
+        return Run_Conveyor_Picking(move, dashboard, vision.bus, color, shape, max_picks,
+                                    stop_event)
+    finally:
+        vision.stop()
+
+# ==============================
+# SYNTHETIC BELT
+# ==============================
+
+def Synthetic_Belt_Video(path="output/synthetic_belt.avi", num_frames=300, fps=30,
+                         size=(640, 480), speed_px=4.0, spacing=160):
+    """
+    Record parts (red square, blue circle, yellow circle, repeating) moving
+    left to right at speed_px per frame on a light-grey belt
+
+    Returns:
+        str: path of the video, usable as Run_Vision_Process(camera_index=path)
+    """
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open {path} for writing")
+
+    parts = ("square", (0, 0, 255)), ("circle", (255, 0, 0)), ("circle", (0, 255, 255))
+    lanes = (height // 3, height // 2, 2 * height // 3)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+
+    try:
+        for n in range(num_frames):
+            frame[:] = 200
+            offset = n * speed_px
+            k = 0
+            x = offset % spacing - spacing
+            while x < width + spacing:
+                part = (k - int(offset // spacing)) % len(parts)
+                kind, bgr = parts[part]
+                cx, cy = int(round(x)), lanes[part]
+                if kind == "circle":
+                    cv2.circle(frame, (cx, cy), 25, bgr, -1)
+                else:
+                    cv2.rectangle(frame, (cx - 22, cy - 22), (cx + 22, cy + 22), bgr, -1)
+                x += spacing
+                k += 1
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    return path
@@ -0,0 +1,222 @@
+"""
+Look-ahead cycle scheduler: overlap vision with motion
+
+Instead of detect → pick all → detect again, a fresh detection is
+requested right after every pick. It runs on a worker thread as soon as
+the feedback pose shows the arm out of the camera's field of view (usually
+during the transfer to the drop point), so the next target list is ready
+by the time the drop finishes and the vision latency is hidden.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .calibration_cache import Undistort_Frame
+from .dobot_controller import GetCurrentPosition, MoveJ, WaitArrive
+from .motion_planner import Plan_Pick_Cycle, Execute_Plan
+from .motion_profiles import Load_Profiles, Validate_Profiles, Apply_Profiles
+from .robot_move import get_targets, HOME_POINT, DROP_POINT, DROP_POINT_UP, PART_WEIGHT
+from . import shape as shape_detector
+
+# ==============================
+# CONFIGURATION
+# ==============================
+
+# Robot-XY box (mm) seen by the camera: (x_min, x_max, y_min, y_max)
+FOV_REGION = (200.0, 450.0, -150.0, 150.0)
+ARM_MARGIN = 25.0          # mm, half-width of the arm links around their axis
+ARM_SAMPLES = 16           # points checked along base → tool
+POLL_INTERVAL = 0.005      # s between feedback checks
+DETECT_TIMEOUT = 5.0       # s
+FRAME_WAIT_NS = 5_000_000  # a grab blocking this long waited for a new exposure
+MAX_STALE_GRABS = 8        # buffered frames dropped at most before using one
+
+
+# ==============================
+# OCCLUSION
+# ==============================
+
+def Arm_Occludes(pose, region=FOV_REGION, margin=ARM_MARGIN):
+    """
+    True if any point on the base → tool line (the arm links, seen from
+    above) lies inside the field-of-view box grown by margin
+    """
+    if pose is None:
+        return True  # no feedback yet: assume the worst
+
+    x_min, x_max, y_min, y_max = region
+    t = np.linspace(0.0, 1.0, ARM_SAMPLES)
+    xs = t * pose[0]
+    ys = t * pose[1]
+
+    inside = (xs > x_min - margin) & (xs < x_max + margin) & \
+             (ys > y_min - margin) & (ys < y_max + margin)
+    return bool(inside.any())
+
+
+# ==============================
+# DETECTORS
+# ==============================
+
+def Grab_After(cap, after_ns):
+    """
+    Grab a frame exposed after after_ns (time.monotonic_ns)
+
+    Frames buffered by the driver come back from grab() at once; a grab
+    started after after_ns that has to block for the next exposure
+    returns a fresh one. Drivers that never block get at most
+    MAX_STALE_GRABS frames dropped.
+
+    Returns:
+        bool: True if a frame was grabbed
+    """
+    for _ in range(MAX_STALE_GRABS):
+        start = time.monotonic_ns()
+        if not cap.grab():
+            return False
+        if start >= after_ns and time.monotonic_ns() - start >= FRAME_WAIT_NS:
+            return True
+    return True
+
+
+def Camera_Detector(camera_index=1, color=None, shape=None):
+    """
+    Returns (detect, release); detect(after_ns) grabs a frame captured
+    after after_ns, runs the shape detector, saves the results and returns
+    the matching targets
+    """
+    cap = cv2.VideoCapture(camera_index)
+    if not cap.isOpened():
+        raise RuntimeError("Could not open camera.")
+
+    def detect(after_ns):
+        # Drop the frames buffered while the arm was in view
+        if not Grab_After(cap, after_ns):
+            raise RuntimeError("Failed to grab frame")
+        ret, frame = cap.retrieve()
+        if not ret:
+            raise RuntimeError("Failed to grab frame")
+
+        frame = Undistort_Frame(frame)
+        objects = shape_detector.Detect_Objects(frame)
+        shape_detector.Save_World_Coordinates(objects, image_size=(frame.shape[1], frame.shape[0]))
+        return get_targets(color, shape)
+
+    return detect, cap.release
+
+
+def Bus_Detector(bus, color=None, shape=None, timeout=DETECT_TIMEOUT):
+    """
+    Returns (detect, release); detect(after_ns) waits for a detection set
+    of a frame captured after after_ns on a shm_bus.DetectionBus
+    """
+    def detect(after_ns):
+        deadline = time.monotonic() + timeout
+        while bus.read_detections()[1]["capture_ns"] <= after_ns:
+            if time.monotonic() > deadline:
+                raise TimeoutError("No fresh detections on the bus")
+            time.sleep(0.001)
+        return get_targets(color, shape, bus=bus)
+
+    return detect, lambda: None
+
+
+# ==============================
+# SCHEDULER
+# ==============================
+
+class LookAheadScheduler:
+    """
+    Runs detect(after_ns) on a worker thread once the arm clears the
+    field of view
+
+    Attributes:
+        exposed: seconds the motion loop actually waited for each result
+                 (0 when the vision latency was fully hidden)
+    """
+
+    def __init__(self, detect, region=FOV_REGION):
+        self.detect = detect
+        self.region = region
+        self.exposed = []
+
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lookahead")
+        self._pending = None
+        self._closed = False
+
+    def _run(self):
+        while Arm_Occludes(GetCurrentPosition(), self.region):
+            if self._closed:
+                return []
+            time.sleep(POLL_INTERVAL)
+        return self.detect(time.monotonic_ns())
+
+    def request(self):
+        """Schedule a detection for the next moment the view is clear"""
+        self._pending = self._pool.submit(self._run)
+
+    def result(self, timeout=DETECT_TIMEOUT):
+        start = time.monotonic()
+        targets = self._pending.result(timeout)
+        self.exposed.append(time.monotonic() - start)
+        self._pending = None
+        return targets
+
+    def close(self):
+        self._closed = True
+        self._pool.shutdown(wait=False)
+
+
+# ==============================
+# PICK LOOP
+# ==============================
+
+def Run_Continuous_Picking(move, dashboard, detect, max_picks=None, payload_g=PART_WEIGHT):
+    """
+    Pick until the scene is empty, re-detecting behind every pick
+
+    Args:
+        move, dashboard: connected robot API objects (feedback thread running)
+        detect: detect(after_ns) → list of (high, low) targets, e.g. from
+                Camera_Detector or Bus_Detector
+    """
+    profiles = Load_Profiles()
+    Validate_Profiles(profiles, payload_g)
+    scheduler = LookAheadScheduler(detect)
+    picks = 0
+
+    try:
+        # Park above the drop point (outside the view) for the first detection
+        MoveJ(move, DROP_POINT_UP)
+        WaitArrive(DROP_POINT_UP, tolerance=2.0, timeout=10.0)
+
+        scheduler.request()
+        targets = scheduler.result()
+
+        while targets and (max_picks is None or picks < max_picks):
+            high, low = targets[0]
+            plan = Apply_Profiles(Plan_Pick_Cycle(high, low, DROP_POINT_UP, DROP_POINT),
+                                  payload_g, profiles)
+
+            # Approach + pick, then look ahead while lifting and placing
+            if not Execute_Plan(move, dashboard, plan[:2]):
+                break
+            scheduler.request()
+            if not Execute_Plan(move, dashboard, plan[2:]):
+                break
+            picks += 1
+
+            targets = scheduler.result()
+
+        MoveJ(move, HOME_POINT)
+    finally:
+        scheduler.close()
+
+    if scheduler.exposed:
+        print(f"{picks} picks, vision wait per cycle: "
+              f"mean {np.mean(scheduler.exposed[1:] or [0]) * 1000:.1f} ms "
+              f"(first detection {scheduler.exposed[0] * 1000:.1f} ms)")
+    return picks
@@ -3,10 +3,21 @@ import socket
 import threading
 from tkinter import Text, END
 import datetime
+import time
+import logging
 import numpy as np
 import os
 import json
 
+# Command / reply traffic is logged at DEBUG: enable with
+# logging.getLogger("dobot_api").setLevel(logging.DEBUG)
+logger = logging.getLogger("dobot_api")
+
+# s to collect the replies of a sendRecvBatch, and of silence that ends
+# draining late replies after a failed batch
+BATCH_REPLY_TIMEOUT = 2.0
+BATCH_DRAIN_QUIET = 0.2
+
 alarmControllerFile = "files/alarm_controller.json"
 alarmServoFile = "files/alarm_servo.json"
 
@@ -90,6 +101,25 @@ MyType = np.dtype([('len', np.int16,),
                    ])
 
 
+# Command encoding: formatters are built once per command name; the
+# optional parameters (e.g. "CP=60", "SpeedJ=80") are appended with a join.
+POSE_COMMANDS = ("MovJ", "MovL", "JointMovJ", "RelMovJ", "RelMovL", "RelJointMovJ",
+                 "MovLIO", "MovJIO")
+POSE_FORMATTERS = {name: (name + "({:f},{:f},{:f},{:f}{})").format for name in POSE_COMMANDS}
+
+
+def encodeParams(dynParams):
+    return "," + ",".join(map(str, dynParams)) if dynParams else ""
+
+
+def encodePoseCommand(name, x, y, z, r, dynParams=()):
+    """
+    e.g. encodePoseCommand("MovJ", 350, 0, 0, 0, ("CP=60",))
+         -> "MovJ(350.000000,0.000000,0.000000,0.000000,CP=60)"
+    """
+    return POSE_FORMATTERS[name](x, y, z, r, encodeParams(dynParams))
+
+
 # 读取控制器和伺服告警文件
 def alarmAlarmJsonFile():
     currrntDirectory = os.path.dirname(__file__)
@@ -103,6 +133,14 @@ def alarmAlarmJsonFile():
     return dataController, dataServo
 
 
+def replyErrorID(reply):
+    """ErrorID of a "ErrorID,{...},Command();" reply, None if unparsable"""
+    try:
+        return int(str(reply).split(",", 1)[0])
+    except ValueError:
+        return None
+
+
 class DobotApi:
     def __init__(self, ip, port, *args, timeout_s=5.0):
         self.ip = ip
@@ -131,14 +169,19 @@ class DobotApi:
             date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S ")
             self.text_log.insert(END, date + text + "\n")
         else:
-            print(text)
+            logger.debug(text)
+
+    def log_enabled(self):
+        # Skip building log lines nobody will see
+        return self.text_log is not None or logger.isEnabledFor(logging.DEBUG)
 
     def send_data(self, string):
         try:
-            self.log(f"Send to {self.ip}:{self.port}: {string}")
-            self.socket_dobot.send(str.encode(string, 'utf-8'))
+            if self.log_enabled():
+                self.log(f"Send to {self.ip}:{self.port}: {string}")
+            self.socket_dobot.sendall(string.encode('utf-8'))
         except Exception as e:
-            print(e)
+            logger.error("Send to %s:%d failed: %s", self.ip, self.port, e)
 
     def wait_reply(self):
         """
@@ -148,14 +191,15 @@ class DobotApi:
         try:
             data = self.socket_dobot.recv(1024)
         except Exception as e:
-            print(e)
+            logger.error("Receive from %s:%d failed: %s", self.ip, self.port, e)
 
         finally:
             if len(data) == 0:
                 data_str = data
             else:
                 data_str = str(data, encoding="utf-8")
-                self.log(f'Receive from {self.ip}:{self.port}: {data_str}')
+                if self.log_enabled():
+                    self.log(f'Receive from {self.ip}:{self.port}: {data_str}')
             return data_str
 
     def close(self):
@@ -174,6 +218,65 @@ class DobotApi:
             recvData = self.wait_reply()
             return recvData
 
+    def sendRecvBatch(self, strings, timeout=BATCH_REPLY_TIMEOUT):
+        """
+    Send several commands in one buffer (a single sendall), then collect
+    one ';'-terminated reply per command within timeout seconds.
+    Nothing is ever resent: motion commands the controller already
+    accepted would be queued twice.
+
+    Returns:
+        list of replies, or None if a reply is missing or carries an
+        ErrorID (late replies are drained so the next command reads its own)
+    """
+        if not strings:
+            return []
+        with self.__globalLock:
+            if self.log_enabled():
+                self.log(f"Send to {self.ip}:{self.port}: {' '.join(strings)}")
+
+            data = b""
+            previous_timeout = self.socket_dobot.gettimeout()
+            try:
+                self.socket_dobot.sendall("".join(strings).encode('utf-8'))
+                deadline = time.monotonic() + timeout
+                while data.count(b";") < len(strings):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise socket.timeout(f"{data.count(b';')}/{len(strings)} replies")
+                    self.socket_dobot.settimeout(remaining)
+                    chunk = self.socket_dobot.recv(1024)
+                    if not chunk:
+                        break
+                    data += chunk
+            except Exception as e:
+                logger.error("Batch to %s:%d failed: %s", self.ip, self.port, e)
+            finally:
+                self.socket_dobot.settimeout(previous_timeout)
+
+            replies = [reply + ";" for reply in str(data, encoding="utf-8").split(";")[:-1]]
+            if self.log_enabled():
+                self.log(f"Receive from {self.ip}:{self.port}: {' '.join(replies)}")
+
+            if len(replies) == len(strings) and all(replyErrorID(r) == 0 for r in replies):
+                return replies
+
+            logger.error("Batch of %d commands to %s:%d got %d replies: %s",
+                         len(strings), self.ip, self.port, len(replies), " ".join(replies))
+            self.drain(previous_timeout)
+            return None
+
+    def drain(self, restore_timeout=None, quiet=BATCH_DRAIN_QUIET):
+        """Discard replies still arriving until the socket stays quiet for quiet seconds"""
+        try:
+            self.socket_dobot.settimeout(quiet)
+            while self.socket_dobot.recv(1024):
+                pass
+        except (socket.timeout, OSError):
+            pass
+        finally:
+            self.socket_dobot.settimeout(restore_timeout)
+
     def __del__(self):
         self.close()
 
@@ -187,13 +290,7 @@ class DobotApiDashboard(DobotApi):
         """
     Enable the robot
     """
-        string = "EnableRobot("
-        for i in range(len(dynParams)):
-            if i == len(dynParams) - 1:
-                string = string + str(dynParams[i])
-            else:
-                string = string + str(dynParams[i]) + ","
-        string = string + ")"
+        string = "EnableRobot(" + ",".join(map(str, dynParams)) + ")"
         return self.sendRecvMsg(string)
 
     def DisableRobot(self):
@@ -434,7 +531,7 @@ class DobotApiDashboard(DobotApi):
     def InverseSolution(self, offset1, offset2, offset3, offset4, user, tool, *dynParams):
         string = "InverseSolution({:f},{:f},{:f},{:f},{:d},{:d}".format(offset1, offset2, offset3, offset4, user, tool)
         for params in dynParams:
-            print(type(params), params)
+            logger.debug("%s %s", type(params), params)
             string = string + repr(params)
         string = string + ")"
         return self.sendRecvMsg(string)
@@ -470,7 +567,7 @@ class DobotApiDashboard(DobotApi):
     def GetInRegs(self, offset1, offset2, offset3, *dynParams):
         string = "GetInRegs({:d},{:d},{:d}".format(offset1, offset2, offset3)
         for params in dynParams:
-            print(type(params), params)
+            logger.debug("%s %s", type(params), params)
             string = string + params[0]
         string = string + ")"
         return self.sendRecvMsg(string)
@@ -481,7 +578,7 @@ class DobotApiDashboard(DobotApi):
 
     def SetCoils(self, offset1, offset2, offset3, offset4):
         string = "SetCoils({:d},{:d},{:d}".format(offset1, offset2, offset3) + "," + repr(offset4) + ")"
-        print(str(offset4))
+        logger.debug("%s", offset4)
         return self.sendRecvMsg(string)
 
     def DI(self, offset1):
@@ -533,6 +630,14 @@ class DobotApiMove(DobotApi):
   Define class dobot_api_move to establish a connection to Dobot
   """
 
+    def MoveBatch(self, moves):
+        """
+    Queue several pose commands with one send
+    moves: iterable of (name, [x, y, z, r], dynParams), e.g. ("MovL", point, ("CP=60",))
+    """
+        return self.sendRecvBatch([encodePoseCommand(name, *point[:4], params)
+                                   for name, point, params in moves])
+
     def MovJ(self, x, y, z, r, *dynParams):
         """
     Joint motion interface (point-to-point motion mode)
@@ -541,12 +646,7 @@ class DobotApiMove(DobotApi):
     z: A number in the Cartesian coordinate system z
     r: A number in the Cartesian coordinate system R
     """
-        string = "MovJ({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
+        string = encodePoseCommand("MovJ", x, y, z, r, dynParams)
         return self.sendRecvMsg(string)
 
     def MovL(self, x, y, z, r, *dynParams):
@@ -557,12 +657,7 @@ class DobotApiMove(DobotApi):
     z: A number in the Cartesian coordinate system z
     r: A number in the Cartesian coordinate system R
     """
-        string = "MovL({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
+        string = encodePoseCommand("MovL", x, y, z, r, dynParams)
         return self.sendRecvMsg(string)
 
     def JointMovJ(self, j1, j2, j3, j4, *dynParams):
@@ -570,12 +665,7 @@ class DobotApiMove(DobotApi):
     Joint motion interface (linear motion mode)
     j1~j6:Point position values on each joint
     """
-        string = "JointMovJ({:f},{:f},{:f},{:f}".format(
-            j1, j2, j3, j4)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
+        string = encodePoseCommand("JointMovJ", j1, j2, j3, j4, dynParams)
         return self.sendRecvMsg(string)
 
     def Jump(self):
@@ -586,11 +676,7 @@ class DobotApiMove(DobotApi):
     Offset motion interface (point-to-point motion mode)
     j1~j6:Point position values on each joint
     """
-        string = "RelMovJ({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
+        string = encodePoseCommand("RelMovJ", x, y, z, r, dynParams)
         return self.sendRecvMsg(string)
 
     def RelMovL(self, offsetX, offsetY, offsetZ, offsetR, *dynParams):
@@ -601,10 +687,7 @@ class DobotApiMove(DobotApi):
     z: Offset in the Cartesian coordinate system Z
     r: Offset in the Cartesian coordinate system R
     """
-        string = "RelMovL({:f},{:f},{:f},{:f}".format(offsetX, offsetY, offsetZ, offsetR)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
+        string = encodePoseCommand("RelMovL", offsetX, offsetY, offsetZ, offsetR, dynParams)
         return self.sendRecvMsg(string)
 
     def MovLIO(self, x, y, z, r, *dynParams):
@@ -622,11 +705,7 @@ class DobotApiMove(DobotApi):
                 Status ：Digital output state（Value range：0/1）
     """
         # example： MovLIO(0,50,0,0,0,0,(0,50,1,0),(1,1,2,1))
-        string = "MovLIO({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
+        string = encodePoseCommand("MovLIO", x, y, z, r, dynParams)
         return self.sendRecvMsg(string)
 
     def MovJIO(self, x, y, z, r, *dynParams):
@@ -644,13 +723,7 @@ class DobotApiMove(DobotApi):
                 Status ：Digital output state（Value range：0/1）
     """
         # example： MovJIO(0,50,0,0,0,0,(0,50,1,0),(1,1,2,1))
-        string = "MovJIO({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        self.log("Send to 192.168.1.6:29999:" + string)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
+        string = encodePoseCommand("MovJIO", x, y, z, r, dynParams)
         return self.sendRecvMsg(string)
 
     def Arc(self, x1, y1, z1, r1, x2, y2, z2, r2, *dynParams):
@@ -665,7 +738,6 @@ class DobotApiMove(DobotApi):
         for params in dynParams:
             string = string + "," + str(params)
         string = string + ")"
-        print(string)
         return self.sendRecvMsg(string)
 
     def Circle(self, x1, y1, z1, r1, x2, y2, z2, r2, count, *dynParams):
@@ -762,11 +834,7 @@ class DobotApiMove(DobotApi):
                 speed_j: Set Cartesian speed scale, value range: 1 ~ 100
                 acc_j: Set acceleration scale value, value range: 1 ~ 100
     """
-        string = "RelJointMovJ({:f},{:f},{:f},{:f}".format(
-            offset1, offset2, offset3, offset4)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
+        string = encodePoseCommand("RelJointMovJ", offset1, offset2, offset3, offset4, dynParams)
         return self.sendRecvMsg(string)
 
     def MovJExt(self, offset1, *dynParams):
@@ -5,8 +5,10 @@ Contains functions for robot connection, movement, and feedback monitoring
 Uses Dobot Python API from https://github.com/Dobot-Arm/TCP-IP-4Axis-Python
 """
 
+import logging
+import socket
 import threading
-from .dobot_api import DobotApiDashboard, DobotApi, DobotApiMove, MyType, alarmAlarmJsonFile
+from .dobot_api import DobotApiDashboard, DobotApi, DobotApiMove, MyType, logger
 from time import sleep
 import numpy as np
 
@@ -17,6 +19,8 @@ enableStatus_robot = None
 robotErrorState = False
 globalLockValue = threading.Lock()
 stop_threads = False
+digital_inputs = 0
+error_event = threading.Event()   # set while the feedback reports ErrorStatus
 
 def ConnectRobot(ip="192.168.1.6", timeout_s=5.0):
     """
@@ -44,6 +48,37 @@ def ConnectRobot(ip="192.168.1.6", timeout_s=5.0):
         raise e
 
 
+def ReadFeedPacket(feed: DobotApi, should_stop):
+    """
+    Read one 1440-byte feedback packet
+
+    Args:
+        feed: DobotApi object for feedback port (socket timeout set)
+        should_stop: callable polled while waiting for data
+
+    Returns:
+        numpy record (MyType) of a valid packet, or None if stopped or invalid
+    """
+    hasRead = 0
+    data = bytes()
+    while hasRead < 1440:
+        if should_stop():
+            return None
+        try:
+            temp = feed.socket_dobot.recv(1440 - hasRead)
+            if len(temp) > 0:
+                hasRead += len(temp)
+                data += temp
+        except socket.timeout:
+            # Timeout reached, loop back to check the stop flag
+            continue
+
+    feedInfo = np.frombuffer(data, dtype=MyType)
+    if hex((feedInfo['test_value'][0])) != '0x123456789abcdef':
+        return None
+    return feedInfo
+
+
 def GetFeed(feed: DobotApi):
     """
     Continuously read feedback from the robot
@@ -52,8 +87,7 @@ def GetFeed(feed: DobotApi):
     Args:
         feed: DobotApi object for feedback port
     """
-    global current_actual, algorithm_queue, enableStatus_robot, robotErrorState, stop_threads
-    hasRead = 0
+    global current_actual, algorithm_queue, enableStatus_robot, robotErrorState, stop_threads, digital_inputs
     
     # Set a timeout on the socket so recv() doesn't block forever
     # This allows the loop to check the 'stop_threads' flag
@@ -61,30 +95,24 @@ def GetFeed(feed: DobotApi):
     
     while not stop_threads: # Check the flag here
         try:
-            data = bytes()
-            while hasRead < 1440 and not stop_threads:
-                try:
-                    temp = feed.socket_dobot.recv(1440 - hasRead)
-                    if len(temp) > 0:
-                        hasRead += len(temp)
-                        data += temp
-                except socket.timeout:
-                    # Timeout reached, loop back to check stop_threads
-                    continue
+            feedInfo = ReadFeedPacket(feed, lambda: stop_threads)
             
             if stop_threads:
                 break
 
-            hasRead = 0
-            feedInfo = np.frombuffer(data, dtype=MyType)
-            
-            if hex((feedInfo['test_value'][0])) == '0x123456789abcdef':
+            if feedInfo is not None:
                 globalLockValue.acquire()
                 current_actual = feedInfo["tool_vector_actual"][0]
                 algorithm_queue = feedInfo['isRunQueuedCmd'][0]
                 enableStatus_robot = feedInfo['EnableStatus'][0]
                 robotErrorState = feedInfo['ErrorStatus'][0]
+                digital_inputs = int(feedInfo['digital_input_bits'][0])
                 globalLockValue.release()
+
+                if robotErrorState[0]:
+                    error_event.set()
+                else:
+                    error_event.clear()
             sleep(0.001)
             
         except Exception as e:
@@ -121,13 +149,18 @@ def WaitArrive(target_point, tolerance=1.0, timeout=30.0):
         timeout: maximum wait time in seconds
         
     Returns:
-        bool: True if robot arrived, False if timeout
+        bool: True if robot arrived, False if timeout or robot error
     """
     print(f"Waiting for robot to reach target: {target_point}")
     start_time = sleep(0)  # Using sleep to track time
     elapsed = 0
     
     while elapsed < timeout:
+        if error_event.is_set():
+            # The controller stopped on an alarm: the target will not be reached
+            print("Robot error: aborting wait")
+            return False
+
         is_arrive = True
         globalLockValue.acquire()
         if current_actual is not None:
@@ -148,31 +181,69 @@ def WaitArrive(target_point, tolerance=1.0, timeout=30.0):
     print(f"Timeout: Robot did not reach target within {timeout}s")
     return False
 
-def MoveJ(move: DobotApiMove, point):
+def MoveJ(move: DobotApiMove, point, *dynParams):
     """
     Move robot to specified point using Joint movement
     
     Args:
         move: DobotApiMove object
         point: [x, y, z, r] coordinates
+        dynParams: optional per-command settings, e.g. "CP=50", "SpeedJ=80"
     """
     print(f"Moving to point: {point}")
-    move.MovJ(point[0], point[1], point[2], point[3])
+    move.MovJ(point[0], point[1], point[2], point[3], *dynParams)
 
 
-def MoveL(move: DobotApiMove, point):
+def MoveL(move: DobotApiMove, point, *dynParams):
     """
     Move robot to specified point using Linear movement
     
     Args:
         move: DobotApiMove object
         point: [x, y, z, r] coordinates
+        dynParams: optional per-command settings, e.g. "CP=50", "SpeedL=80"
     """
     print(f"Moving to point: {point}")
-    move.MovL(point[0], point[1], point[2], point[3])
+    move.MovL(point[0], point[1], point[2], point[3], *dynParams)
 
 
-def SetupRobot(dashboard: DobotApiDashboard, speed_ratio=50, acc_ratio=50, payload_weight=50):
+def MoveBatch(move: DobotApiMove, moves):
+    """
+    Queue several moves with one send (one buffer, one sendall)
+    
+    Args:
+        move: DobotApiMove object
+        moves: list of (mode, point, dynParams), mode "J" (MovJ) or "L" (MovL)
+
+    Returns:
+        bool: False if the controller did not acknowledge every move
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Queueing %d moves: %s", len(moves),
+                     " → ".join(str(point) for _, point, _ in moves))
+    return move.MoveBatch([("Mov" + mode, point, params) for mode, point, params in moves]) is not None
+
+
+def ClearError(dashboard: DobotApiDashboard):
+    """
+    Clear the controller alarms
+
+    On success error_event is cleared right away, so a WaitArrive issued
+    next does not abort on the ErrorStatus of a feedback packet received
+    before the clear.
+
+    Returns:
+        bool: True if the controller accepted the command
+    """
+    reply = dashboard.ClearError()
+    ok = str(reply).startswith("0")
+    if ok:
+        error_event.clear()
+    return ok
+
+
+def SetupRobot(dashboard: DobotApiDashboard, speed_ratio=50, acc_ratio=50, payload_weight=50,
+               cp_ratio=None):
     """
     Initialize and configure the robot
     
@@ -181,9 +252,10 @@ def SetupRobot(dashboard: DobotApiDashboard, speed_ratio=50, acc_ratio=50, paylo
         speed_ratio: Speed ratio percentage (1-100)
         acc_ratio: Acceleration ratio percentage (1-100)
         payload_weight: Payload weight (in grams) (0-750)
+        cp_ratio: Default continuous-path blend ratio (1-100), None leaves the controller setting
     """
     print("Clearing any errors...")
-    dashboard.ClearError()
+    ClearError(dashboard)
     sleep(0.5)
     
     print("Enabling robot...")
@@ -196,6 +268,8 @@ def SetupRobot(dashboard: DobotApiDashboard, speed_ratio=50, acc_ratio=50, paylo
     dashboard.SpeedL(speed_ratio)  # Linear speed ratio
     dashboard.AccJ(acc_ratio)      # Joint acceleration
     dashboard.AccL(acc_ratio)      # Linear acceleration
+    if cp_ratio is not None:
+        dashboard.CP(cp_ratio)     # Blending for moves without their own CP=
 
     dashboard.PayLoad(payload_weight, 0)
     
@@ -233,6 +307,19 @@ def GetCurrentPosition():
     return pos
 
 
+def GetDigitalInputs():
+    """
+    Get the digital input bits from the latest feedback packet (no dashboard round trip)
+    
+    Returns:
+        int: DI bitmask, bit 0 = DI1
+    """
+    globalLockValue.acquire()
+    bits = digital_inputs
+    globalLockValue.release()
+    return bits
+
+
 def DisconnectRobot(dashboard, move, feed, feed_thread=None):
     """
     Safely disconnect from the robot
@@ -0,0 +1,82 @@
+"""
+Frame buffer arena
+
+Keeps the full-size working images of the perception stack alive between
+frames so that steady-state processing at a fixed camera resolution does
+not allocate any large arrays.
+"""
+
+import threading
+
+import numpy as np
+
+
+class FrameArena:
+    """
+    Named pool of reusable numpy buffers
+
+    Asking for the same name, shape and dtype again returns the same
+    array, so callers must be done with a buffer's previous contents
+    before requesting it again. A request with another shape or dtype
+    replaces the buffer, so a resolution change does not leave the old
+    sizes behind. get() is thread-safe, so worker threads can share one
+    arena as long as they use distinct names.
+    """
+
+    def __init__(self):
+        self.buffers = {}
+        self.allocations = 0
+        self._lock = threading.Lock()
+
+    def get(self, name, shape, dtype=np.uint8):
+        """
+        Return the buffer registered under name, allocating it on first use
+
+        Args:
+            name: buffer name, unique per pipeline stage
+            shape: required array shape
+            dtype: required numpy dtype
+
+        Returns:
+            numpy.ndarray: uninitialised buffer of the given shape/dtype
+        """
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        buf = self.buffers.get(name)
+
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            with self._lock:
+                buf = self.buffers.get(name)
+                if buf is None or buf.shape != shape or buf.dtype != dtype:
+                    buf = np.empty(shape, dtype=dtype)
+                    self.buffers[name] = buf
+                    self.allocations += 1
+
+        return buf
+
+    def like(self, name, array):
+        """Shortcut for get(name, array.shape, array.dtype)"""
+        return self.get(name, array.shape, array.dtype)
+
+    def clear(self):
+        """Release every buffer"""
+        self.buffers.clear()
+
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self.buffers.values())
+
+
+# ===============================
+# Structuring Elements
+# ===============================
+
+_KERNELS = {}
+
+def Get_Kernel(size):
+    """Return a cached size x size rectangular uint8 kernel"""
+    kernel = _KERNELS.get(size)
+
+    if kernel is None:
+        kernel = np.ones((size, size), np.uint8)
+        _KERNELS[size] = kernel
+
+    return kernel
@@ -0,0 +1,119 @@
+"""
+Grasp pose computation
+
+Turns the objects found by shape.Detect_Objects into robot [X, Y, R]
+poses in one vectorized pass: sub-pixel centroids and grasp axes
+(principal axis from the contour moments, the minAreaRect side for
+four-sided parts, the direction to a vertex for triangles) are projected
+through the homography together.
+"""
+
+import cv2
+import numpy as np
+
+# Pixel length of the axis segment projected to measure the world angle
+AXIS_PROBE_PX = 20.0
+
+# Added to every R, for a tool mounted rotated relative to J4 zero
+R_OFFSET = 0.0
+
+# Rotational symmetry (degrees) per shape; 0 means orientation is irrelevant
+SHAPE_SYMMETRY = {
+    "circle": 0,
+    "square": 90,
+    "rectangle": 180,
+    "triangle": 120,
+    "polygon": 0,
+}
+
+# Shapes whose axis comes from minAreaRect instead of the moments
+RECT_SHAPES = ("square", "rectangle")
+
+# Shapes whose axis points at a vertex: their second moments are
+# isotropic, so the principal axis is noise
+VERTEX_SHAPES = ("triangle",)
+
+
+def Principal_Angles(mu20, mu11, mu02):
+    """
+    Principal-axis angle (radians, image frame) from central moments
+
+    Args:
+        mu20, mu11, mu02: arrays of second-order central moments
+
+    Returns:
+        numpy.ndarray: angles in (-pi/2, pi/2]
+    """
+    return 0.5 * np.arctan2(2.0 * mu11, mu20 - mu02)
+
+
+def Vertex_Angle(contour, center):
+    """
+    Angle (radians, image frame) from center to a vertex of the contour's
+    minimum enclosing triangle; any vertex gives the same R once folded
+    by the 120 degree symmetry
+    """
+    _, triangle = cv2.minEnclosingTriangle(np.asarray(contour, dtype=np.float32))
+    vertex = triangle.reshape(-1, 2)[0]
+    return np.arctan2(vertex[1] - center[1], vertex[0] - center[0])
+
+
+def Fold_Angle(angle_deg, symmetry):
+    """
+    Map angles into the smallest equivalent rotation (-symmetry/2, symmetry/2]
+
+    Entries with symmetry 0 are set to 0.
+    """
+    period = np.where(symmetry > 0, symmetry, 1.0)
+    folded = angle_deg - period * np.ceil(angle_deg / period - 0.5)
+    return np.where(symmetry > 0, folded, 0.0)
+
+
+def Compute_Grasp_Poses(objects, H=None, to_world=None):
+    """
+    Compute robot grasp poses for all objects at once
+
+    Args:
+        objects: list of dicts from Detect_Objects
+                 ("center", "mu", "rect_angle", "shape", "contour")
+        H: 3x3 pixel -> robot homography
+        to_world: alternative (N, 2) pixel -> (N, 2) robot converter,
+                  e.g. calibration_cache.Pixel_To_World_Batch
+
+    Returns:
+        numpy.ndarray: (N, 3) float64 array of [X, Y, R] rows, R in degrees
+    """
+    n = len(objects)
+    if n == 0:
+        return np.empty((0, 3), dtype=np.float64)
+
+    centers = np.array([obj["center"] for obj in objects], dtype=np.float64)
+    mu = np.array([obj["mu"] for obj in objects], dtype=np.float64)
+    rect_angle = np.array([obj["rect_angle"] for obj in objects], dtype=np.float64)
+    shapes = np.array([obj["shape"] for obj in objects])
+    symmetry = np.array([SHAPE_SYMMETRY.get(name, 0) for name in shapes], dtype=np.float64)
+
+    theta = np.where(np.isin(shapes, RECT_SHAPES), rect_angle,
+                     Principal_Angles(mu[:, 0], mu[:, 1], mu[:, 2]))
+    for i in np.flatnonzero(np.isin(shapes, VERTEX_SHAPES)):
+        if objects[i].get("contour") is not None:
+            theta[i] = Vertex_Angle(objects[i]["contour"], centers[i])
+    axis = np.stack([np.cos(theta), np.sin(theta)], axis=1) * AXIS_PROBE_PX
+
+    # Centers and axis tips in a single projection
+    pixels = np.concatenate([centers, centers + axis])
+    if to_world is not None:
+        world = to_world(pixels)
+    else:
+        world = cv2.perspectiveTransform(pixels.reshape(-1, 1, 2),
+                                         np.asarray(H, dtype=np.float64)).reshape(-1, 2)
+    world_centers, world_tips = world[:n], world[n:]
+
+    d = world_tips - world_centers
+    angle = np.degrees(np.arctan2(d[:, 1], d[:, 0]))
+
+    poses = np.empty((n, 3), dtype=np.float64)
+    poses[:, :2] = world_centers
+    poses[:, 2] = Fold_Angle(angle, symmetry) + R_OFFSET
+
+    return poses
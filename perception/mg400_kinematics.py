@@ -0,0 +1,193 @@
+"""
+Local MG400 kinematic model
+
+Vectorized inverse kinematics over all targets at once, joint-limit and
+forbidden-zone checks, and joint-space travel time estimates, so
+unreachable targets are dropped before anything is sent to the controller
+(instead of one InverseSolution round trip, or a WaitArrive timeout, per
+target).
+
+Geometry: J1 rotates the arm about the vertical axis; the parallel
+linkage makes J2 the upper-arm angle from vertical and J3 the forearm
+angle below horizontal, with the flange kept horizontal. The tool
+rotation is r = J1 + J4. Lengths and limits are the nominal datasheet
+values (mm, degrees); TOOL_LENGTH has to match the mounted end effector.
+"""
+
+import numpy as np
+
+# ==============================
+# GEOMETRY / LIMITS
+# ==============================
+
+BASE_OFFSET = 43.0        # J1 axis → J2 axis, horizontal
+UPPER_ARM = 175.0         # J2 → J3
+FOREARM = 175.0           # J3 → flange axis
+FLANGE_OFFSET = 66.0      # flange axis → tool center, horizontal
+J2_HEIGHT = 0.0           # z of the J2 axis in the robot frame
+TOOL_LENGTH = 60.0        # flange → suction cup tip, vertical (poses are the cup tip)
+
+JOINT_LIMITS = np.array([
+    [-160.0, 160.0],      # J1
+    [-25.0, 85.0],        # J2
+    [-25.0, 105.0],       # J3
+    [-180.0, 180.0],      # J4
+])
+J3_MINUS_J2 = (-60.0, 60.0)   # linkage constraint between the two arms
+
+JOINT_MAX_SPEED = np.array([300.0, 300.0, 300.0, 300.0])      # deg/s at 100 %
+JOINT_MAX_ACC = np.array([1200.0, 1200.0, 1200.0, 1200.0])    # deg/s² at 100 %
+
+# Axis-aligned boxes the tool must not enter: (x_min, x_max, y_min, y_max, z_min, z_max)
+FORBIDDEN_ZONES = []
+
+# ==============================
+# KINEMATICS
+# ==============================
+
+def Inverse_Kinematics(points):
+    """
+    Joint angles for (N, 4) [x, y, z, r] tool poses
+
+    Returns:
+        tuple: ((N, 4) joint angles in degrees, (N,) bool mask of poses that
+                are geometrically reachable and within the joint limits)
+    """
+    p = np.asarray(points, dtype=np.float64).reshape(-1, 4)
+    x, y, z, r = p.T
+
+    j1 = np.arctan2(y, x)
+    rho = np.hypot(x, y) - BASE_OFFSET - FLANGE_OFFSET
+    h = z + TOOL_LENGTH - J2_HEIGHT
+    d = np.hypot(rho, h)
+
+    cos_a = (UPPER_ARM ** 2 + d ** 2 - FOREARM ** 2) / (2 * UPPER_ARM * np.maximum(d, 1e-9))
+    geometric = (np.abs(cos_a) <= 1.0) & (d > 0)
+
+    # Elbow-up solution: upper arm above the line J2 → wrist
+    upper = np.arctan2(h, rho) + np.arccos(np.clip(cos_a, -1.0, 1.0))
+    forearm = np.arctan2(h - UPPER_ARM * np.sin(upper), rho - UPPER_ARM * np.cos(upper))
+
+    q = np.degrees(np.column_stack([j1, np.pi / 2 - upper, -forearm, np.zeros_like(j1)]))
+    q[:, 3] = (r - q[:, 0] + 180.0) % 360.0 - 180.0
+
+    ok = geometric & Within_Limits(q)
+    return q, ok
+
+
+def Forward_Kinematics(q):
+    """(N, 4) joint angles (deg) → (N, 4) [x, y, z, r]"""
+    q = np.radians(np.asarray(q, dtype=np.float64).reshape(-1, 4))
+    j1, j2, j3, j4 = q.T
+
+    rho = BASE_OFFSET + UPPER_ARM * np.sin(j2) + FOREARM * np.cos(j3) + FLANGE_OFFSET
+    z = J2_HEIGHT - TOOL_LENGTH + UPPER_ARM * np.cos(j2) - FOREARM * np.sin(j3)
+
+    return np.column_stack([rho * np.cos(j1), rho * np.sin(j1), z, np.degrees(j1 + j4)])
+
+
+def Within_Limits(q):
+    q = np.asarray(q, dtype=np.float64).reshape(-1, 4)
+    inside = np.all((q >= JOINT_LIMITS[:, 0]) & (q <= JOINT_LIMITS[:, 1]), axis=1)
+    coupling = q[:, 2] - q[:, 1]
+    return inside & (coupling >= J3_MINUS_J2[0]) & (coupling <= J3_MINUS_J2[1])
+
+# ==============================
+# FORBIDDEN ZONES
+# ==============================
+
+def In_Forbidden_Zone(points, zones=None):
+    """(N,) mask of [x, y, z, ...] points inside any forbidden box"""
+    if zones is None:
+        zones = FORBIDDEN_ZONES
+
+    p = np.asarray(points, dtype=np.float64).reshape(len(points), -1)[:, :3]
+    hit = np.zeros(len(p), dtype=bool)
+    if len(zones) == 0:
+        return hit
+
+    boxes = np.asarray(zones, dtype=np.float64)          # (Z, 6)
+    lo, hi = boxes[:, 0::2], boxes[:, 1::2]              # (Z, 3)
+    inside = np.all((p[:, None, :] >= lo) & (p[:, None, :] <= hi), axis=2)
+    return hit | inside.any(axis=1)
+
+
+def Path_Hits_Zones(start, ends, zones=None, samples=16):
+    """
+    (N,) mask of straight moves start → ends[i] passing through a
+    forbidden box (checked at `samples` points per move)
+    """
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 4)[:, :3]
+    t = np.linspace(0.0, 1.0, samples)[None, :, None]
+    path = np.asarray(start[:3], dtype=np.float64) + t * (ends[:, None, :] - np.asarray(start[:3]))
+    return In_Forbidden_Zone(path.reshape(-1, 3), zones).reshape(len(ends), samples).any(axis=1)
+
+# ==============================
+# TARGET CHECKS
+# ==============================
+
+def Reachable(points, zones=None):
+    """(N,) mask: IK solution within limits and outside forbidden zones"""
+    _, ok = Inverse_Kinematics(points)
+    return ok & ~In_Forbidden_Zone(points, zones)
+
+
+def Check_Targets(targets, zones=None):
+    """
+    Mask of (high, low) target pairs whose both poses are reachable and
+    whose vertical descent stays out of the forbidden zones
+    """
+    if len(targets) == 0:
+        return np.zeros(0, dtype=bool)
+
+    high = np.array([t[0] for t in targets], dtype=np.float64)
+    low = np.array([t[1] for t in targets], dtype=np.float64)
+
+    ok = Reachable(high, zones) & Reachable(low, zones)
+
+    # Vertical descent: same XY, z sweeps between the two poses
+    if zones is None:
+        zones = FORBIDDEN_ZONES
+    if len(zones):
+        boxes = np.asarray(zones, dtype=np.float64)
+        x, y = high[:, 0:1], high[:, 1:2]
+        z_lo = np.minimum(high[:, 2:3], low[:, 2:3])
+        z_hi = np.maximum(high[:, 2:3], low[:, 2:3])
+        hit = (x >= boxes[:, 0]) & (x <= boxes[:, 1]) & (y >= boxes[:, 2]) & (y <= boxes[:, 3]) & \
+              (z_lo <= boxes[:, 5]) & (z_hi >= boxes[:, 4])
+        ok &= ~hit.any(axis=1)
+
+    return ok
+
+
+def Joint_Travel_Time(q_from, q_to, speed_ratio=100, acc_ratio=100):
+    """
+    Synchronized joint move time (s) from one configuration to (N, 4)
+    others: the slowest joint under a trapezoidal profile
+    """
+    dq = np.abs(np.asarray(q_to, dtype=np.float64).reshape(-1, 4) - np.asarray(q_from)[:4])
+    v = JOINT_MAX_SPEED * speed_ratio / 100.0
+    a = JOINT_MAX_ACC * acc_ratio / 100.0
+
+    triangular = dq <= v * v / a
+    t = np.where(triangular, 2.0 * np.sqrt(dq / a), dq / v + v / a)
+    return t.max(axis=1)
+
+
+def Order_By_Travel_Time(targets, start, speed_ratio=100, acc_ratio=100):
+    """
+    Sort (high, low) targets by the joint travel time from the start pose
+    to their high point
+
+    Returns:
+        tuple: (sorted targets, travel times in the same order)
+    """
+    if len(targets) == 0:
+        return [], np.zeros(0)
+
+    q_start, _ = Inverse_Kinematics(start)
+    q_high, _ = Inverse_Kinematics([t[0] for t in targets])
+    times = Joint_Travel_Time(q_start[0], q_high, speed_ratio, acc_ratio)
+
+    order = np.argsort(times, kind="stable")
+    return [targets[i] for i in order], times[order]
@@ -0,0 +1,138 @@
+"""
+Blended pick-and-place motion planning for the Dobot MG400
+
+A pick cycle is a list of Segments. Segments that only pass through a
+waypoint (approach, lift, transfer) are queued back to back with a CP
+(continuous path) ratio, so the controller blends into the next move
+instead of decelerating to zero. Only segments where the vacuum changes
+state stop exactly (CP 0) and are waited for.
+"""
+
+from collections import namedtuple
+from time import sleep
+
+from .dobot_controller import MoveJ, MoveL, MoveBatch, WaitArrive, ControlDigitalOutput
+
+# ==============================
+# CONFIGURATION
+# ==============================
+
+BLEND_CP = 60             # CP ratio (1-100) at pass-through waypoints
+VACUUM_DWELL = 0.3        # s to build / release vacuum after switching
+ARRIVE_TOLERANCE = 2.0    # mm
+ARRIVE_TIMEOUT = 10.0     # s, covers the queued segments before a stop
+BATCH_COMMANDS = False    # send the segments up to each stop in one buffer
+                          # (not yet verified on the controller)
+
+# One motion command of a plan
+#   mode:   "J" (MovJ) or "L" (MovL)
+#   cp:     blend ratio into the next segment, 0 = exact stop
+#   speed, acc: per-command ratios (1-100), None = global SpeedJ/L, AccJ/L
+#   wait:   block until the arm is at point before the next segment
+#   vacuum: DO1 state to set on arrival (requires wait), None = unchanged
+Segment = namedtuple("Segment", "name point mode cp speed acc wait vacuum",
+                     defaults=("J", 0, None, None, False, None))
+
+
+# ==============================
+# PLANNING
+# ==============================
+
+def Plan_Pick_Cycle(high, low, drop_up, drop, cp=BLEND_CP):
+    """
+    approach → pick → lift → transfer → drop → leave, with blending at
+    the pass-through points
+
+    Args:
+        high, low: [x, y, z, r] above / at the object
+        drop_up, drop: [x, y, z, r] above / at the drop position
+        cp: blend ratio for pass-through points (0 reproduces stop-and-go)
+
+    Returns:
+        list of Segment
+    """
+    return [
+        Segment("approach", high, "J", cp),
+        Segment("pick", low, "L", 0, wait=True, vacuum=1),
+        Segment("lift", high, "L", cp),
+        Segment("transfer", drop_up, "J", cp),
+        Segment("drop", drop, "L", 0, wait=True, vacuum=0),
+        Segment("leave", drop_up, "L", cp),
+    ]
+
+
+def Segment_Params(segment):
+    """Per-command options for MovJ / MovL (e.g. "CP=60", "SpeedL=80")"""
+    params = []
+    if segment.cp:
+        params.append(f"CP={int(segment.cp)}")
+    if segment.speed is not None:
+        params.append(f"Speed{segment.mode}={int(segment.speed)}")
+    if segment.acc is not None:
+        params.append(f"Acc{segment.mode}={int(segment.acc)}")
+    return params
+
+
+# ==============================
+# EXECUTION
+# ==============================
+
+def Execute_Plan(move, dashboard, segments, tolerance=ARRIVE_TOLERANCE, timeout=ARRIVE_TIMEOUT,
+                 batch=BATCH_COMMANDS):
+    """
+    Queue the segments; wait and switch the vacuum only where requested.
+    With batch, the segments up to each stop are sent to the controller
+    as one buffer (dobot_api.sendRecvBatch).
+
+    Returns:
+        bool: False if a waited-for point was not reached
+    """
+    return Run_Segments(
+        segments,
+        move_j=lambda point, *params: MoveJ(move, point, *params),
+        move_l=lambda point, *params: MoveL(move, point, *params),
+        wait_arrive=WaitArrive,
+        set_vacuum=lambda status: ControlDigitalOutput(dashboard, output_index=1, status=status),
+        tolerance=tolerance, timeout=timeout,
+        move_batch=(lambda moves: MoveBatch(move, moves)) if batch else None)
+
+
+def Run_Segments(segments, move_j, move_l, wait_arrive, set_vacuum,
+                 tolerance=ARRIVE_TOLERANCE, timeout=ARRIVE_TIMEOUT, move_batch=None):
+    """
+    Execute_Plan for any robot: the motion, arrival and vacuum primitives
+    are passed in (see robot_cell.RobotCell.execute)
+
+    move_batch: optional move_batch([(mode, point, params), ...]) sending
+                the queued segments up to the next stop in one go; a
+                False return (moves not acknowledged) aborts the plan
+    """
+    pending = []
+
+    for n, segment in enumerate(segments):
+
+        params = Segment_Params(segment)
+        if move_batch is not None:
+            pending.append((segment.mode, segment.point, params))
+            if segment.wait or n == len(segments) - 1:
+                if not move_batch(pending):
+                    print(f"*** Controller did not acknowledge the moves up to {segment.name} ***")
+                    return False
+                pending = []
+        elif segment.mode == "L":
+            move_l(segment.point, *params)
+        else:
+            move_j(segment.point, *params)
+
+        if not segment.wait:
+            continue
+
+        if not wait_arrive(segment.point, tolerance=tolerance, timeout=timeout):
+            print(f"*** Failed to reach {segment.name} position ***")
+            return False
+
+        if segment.vacuum is not None:
+            set_vacuum(segment.vacuum)
+            sleep(VACUUM_DWELL)
+
+    return True
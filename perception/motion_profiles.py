@@ -0,0 +1,166 @@
+"""
+Per-segment speed / acceleration profiles
+
+Each pick-cycle segment (motion_planner.Plan_Pick_Cycle) gets the ratios
+of its profile instead of the single global SpeedJ/AccJ: empty transits
+run fast, the vacuum descent and the place move run gently, and loaded
+moves are scaled down with the payload so the cup does not lose the part.
+
+Profiles can be overridden from PROFILES_PATH (same layout as PROFILES)
+and are checked by Validate_Profiles before use.
+"""
+
+import json
+import os
+
+import numpy as np
+
+PROFILES_PATH = "output/motion_profiles.json"
+
+# ratio = percent of the controller maximum (1-100)
+PROFILES = {
+    "transit": {"speed": 100, "acc": 80},   # empty moves
+    "descent": {"speed": 30, "acc": 30},    # final approach onto the part
+    "loaded": {"speed": 80, "acc": 60},     # part on the cup, before payload scaling
+    "place": {"speed": 30, "acc": 30},      # final descent to the drop point
+}
+
+# Which profile each planner segment uses
+SEGMENT_PROFILES = {
+    "approach": "transit",
+    "pick": "descent",
+    "lift": "loaded",
+    "transfer": "loaded",
+    "drop": "place",
+    "leave": "transit",
+}
+
+LOADED_SEGMENTS = ("lift", "transfer", "drop")
+
+# Nominal MG400 Cartesian limits at 100 % (used for time / force estimates)
+MAX_SPEED = 1000.0        # mm/s
+MAX_ACC = 4000.0          # mm/s²
+MAX_PAYLOAD = 750.0       # g
+
+VACUUM_HOLD_N = 6.0       # holding force of the suction cup
+HOLD_SAFETY = 2.0         # required margin on VACUUM_HOLD_N
+
+# ==============================
+# LOADING / VALIDATION
+# ==============================
+
+def Load_Profiles(path=PROFILES_PATH):
+    """PROFILES updated with the overrides in path (if it exists)"""
+    profiles = {name: dict(values) for name, values in PROFILES.items()}
+
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for name, values in json.load(f).items():
+                profiles.setdefault(name, {}).update(values)
+
+    return profiles
+
+
+def Payload_Scale(payload_g):
+    """Speed/acc factor for loaded moves: 1 empty, 0.5 at the rated payload"""
+    return 1.0 - 0.5 * min(max(payload_g, 0.0), MAX_PAYLOAD) / MAX_PAYLOAD
+
+
+def Profile_Ratios(profile_name, payload_g=0.0, profiles=PROFILES):
+    """(speed, acc) ratios of a profile, payload-scaled for "loaded" """
+    speed = profiles[profile_name]["speed"]
+    acc = profiles[profile_name]["acc"]
+
+    if profile_name == "loaded":
+        scale = Payload_Scale(payload_g)
+        speed, acc = speed * scale, acc * scale
+
+    return max(1, int(round(speed))), max(1, int(round(acc)))
+
+
+def Validate_Profiles(profiles, payload_g=0.0):
+    """
+    Raise ValueError if a ratio is outside 1-100 or a loaded move
+    accelerates the part harder than the cup can hold
+
+    Returns:
+        dict: profile name -> peak inertial force on the part (N)
+    """
+    forces = {}
+    mass_kg = payload_g / 1000.0
+
+    for name, values in profiles.items():
+        for key in ("speed", "acc"):
+            value = values.get(key)
+            if value is None or not (1 <= value <= 100):
+                raise ValueError(f"Profile {name!r}: {key} must be 1-100, got {value!r}")
+
+        _, acc = Profile_Ratios(name, payload_g, profiles)
+        # Peak acceleration plus gravity on a vertically held part
+        forces[name] = mass_kg * (acc / 100.0 * MAX_ACC / 1000.0 + 9.81)
+
+    for segment in LOADED_SEGMENTS:
+        name = SEGMENT_PROFILES[segment]
+        if forces[name] * HOLD_SAFETY > VACUUM_HOLD_N:
+            raise ValueError(f"Profile {name!r} needs {forces[name]:.2f} N on a {payload_g:g} g part; "
+                             f"the cup holds {VACUUM_HOLD_N / HOLD_SAFETY:.2f} N with margin")
+
+    return forces
+
+# ==============================
+# APPLYING TO A PLAN
+# ==============================
+
+def Apply_Profiles(segments, payload_g=0.0, profiles=None):
+    """
+    Return the segments with speed/acc set from their profile
+
+    Args:
+        segments: list of motion_planner.Segment
+        payload_g: weight of the picked part
+        profiles: profile table, default Load_Profiles()
+    """
+    if profiles is None:
+        profiles = Load_Profiles()
+
+    planned = []
+    for segment in segments:
+        name = SEGMENT_PROFILES.get(segment.name)
+        if name is None:
+            planned.append(segment)
+            continue
+
+        speed, acc = Profile_Ratios(name, payload_g, profiles)
+        planned.append(segment._replace(speed=speed, acc=acc))
+
+    return planned
+
+# ==============================
+# TIME ESTIMATES
+# ==============================
+
+def Estimate_Move_Time(start, end, speed=100, acc=100):
+    """
+    Trapezoidal-velocity estimate of a straight XYZ move in seconds
+    """
+    distance = float(np.linalg.norm(np.subtract(end[:3], start[:3])))
+    v = speed / 100.0 * MAX_SPEED
+    a = acc / 100.0 * MAX_ACC
+
+    if distance <= v * v / a:        # triangular profile, never reaches v
+        return 2.0 * np.sqrt(distance / a)
+    return distance / v + v / a
+
+
+def Estimate_Plan_Time(start, segments):
+    """
+    Sum of the segment estimates; segments without ratios count at 50 %
+    (SetupRobot default)
+    """
+    total = 0.0
+    position = start
+    for segment in segments:
+        total += Estimate_Move_Time(position, segment.point,
+                                    segment.speed or 50, segment.acc or 50)
+        position = segment.point
+    return total
@@ -1,9 +1,13 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import cv2
-import json
 import time
 
+from .background import DEFAULT_SEGMENTER, Make_Segmenter
+from .calibration_cache import H_CACHE, Pixel_To_World_Batch, Undistort_Frame
+from .frame_arena import FrameArena, Get_Kernel
+from .results_store import CENTROIDS_PATH, Save_Detections
+
 def CaptureImg(save_path="output/captured_img.png", camera_index=1):
     # Open camera
     cap = cv2.VideoCapture(camera_index)
@@ -36,9 +40,8 @@ def CaptureImg(save_path="output/captured_img.png", camera_index=1):
     return frame
     
 def load_H_Matrix():
-    with open("output/H_matrix.json", "r") as f:
-        H = np.array(json.load(f))
-    return H   
+    # Cached; reloaded automatically when H_matrix.json changes
+    return H_CACHE.get()
 
 def save_image(image):
    cv2.imshow("Image", image)
@@ -55,55 +58,85 @@ def pixel_to_robot(u, v, H):
     Y = pr[1, 0]
     return X, Y
 
-def filter_image(img): 
-   T = 120
-   _, bin_img = cv2.threshold(img, T, 255, cv2.THRESH_BINARY_INV)
+# Blob filters applied to the connectedComponentsWithStats table
+MIN_BLOB_AREA = 150        # px, measured after erosion
+MAX_BLOB_AREA = 100000
+MIN_ASPECT = 0.2
+MAX_ASPECT = 5.0
 
-   kernel = np.ones((10, 10), np.uint8)
-   closing = cv2.morphologyEx(bin_img, cv2.MORPH_CLOSE, kernel)
-   kernel = np.ones((3, 3), np.uint8)
-   return cv2.erode(closing, kernel, iterations=6)
+# Six 3x3 erosions == one 13x13 erosion (rectangular kernels compose)
+ERODE_SIZE = 1 + 6 * (3 - 1)
 
-def object_detection(img,H,img_clr):
-   eroded = filter_image(img)
-   data = {}  # Dictionary to store JSON data 
-   num_labels, labeled_img, stats, centroids = cv2.connectedComponentsWithStats(eroded, connectivity=4, ltype=cv2.CV_32S)
+def filter_image(img, dst=None, arena=None, segmenter=None):
+   # segmenter: background.OtsuThreshold / AdaptiveThreshold / BackgroundModel,
+   # None keeps the fixed threshold
+   T = 120
+   if arena is None:
+      arena = FrameArena()
+   bin_img = arena.get("bin_img", img.shape)
+   closing = arena.get("closing", img.shape)
+   if dst is None:
+      dst = arena.get("eroded", img.shape)
+
+   if segmenter is None:
+      cv2.threshold(img, T, 255, cv2.THRESH_BINARY_INV, dst=bin_img)
+   else:
+      segmenter.binarize(img, bin_img)
+
+   cv2.morphologyEx(bin_img, cv2.MORPH_CLOSE, Get_Kernel(10), dst=closing)
+   return cv2.erode(closing, Get_Kernel(ERODE_SIZE), dst=dst)
+
+def filter_components(stats):
+   # Vectorized area / aspect-ratio test over all labels (label 0 = background)
+   w = stats[1:, cv2.CC_STAT_WIDTH].astype(np.float64)
+   h = stats[1:, cv2.CC_STAT_HEIGHT].astype(np.float64)
+   area = stats[1:, cv2.CC_STAT_AREA]
+
+   aspect = np.divide(w, h, out=np.zeros_like(w), where=h > 0)
+   keep = (area > MIN_BLOB_AREA) & (area < MAX_BLOB_AREA) & \
+          (aspect > MIN_ASPECT) & (aspect < MAX_ASPECT)
+   return np.flatnonzero(keep) + 1
+
+def object_detection(img,H,img_clr,arena=None,annotate=True,segmenter=None):
+   if arena is None:
+      arena = FrameArena()
+   eroded = filter_image(img, arena=arena, segmenter=segmenter)
+   labels = arena.get("labels", img.shape, np.int32)
+   num_labels, labeled_img, stats, centroids = cv2.connectedComponentsWithStats(eroded, labels, connectivity=4, ltype=cv2.CV_32S)
+
+   keep = filter_components(stats)
+   points = centroids[keep]
+
+   # Convert every centroid in one call
+   if H is not None:
+      world = cv2.perspectiveTransform(points.reshape(-1, 1, 2), H).reshape(-1, 2)
+   else:
+      world = Pixel_To_World_Batch(points, (img.shape[1], img.shape[0]))
+
+   # Save to the results store
+   Save_Detections({"X": world[:, 0], "Y": world[:, 1], "cx": points[:, 0], "cy": points[:, 1],
+                    "area": stats[keep, cv2.CC_STAT_AREA]}, CENTROIDS_PATH, kind="centroids")
 
    # Draw Centroids
-   for i, (cx, cy) in enumerate(centroids[1:], start=1):
-      cx, cy = int(cx), int(cy)
-      X, Y = pixel_to_robot(cx, cy, H)
-      # print(f'Centroid: ({cx},{cy})')
-
-      cv2.circle(img_clr, (cx,cy), 2, (191,40,0), 2)
-      cv2.putText(img_clr, f"({cx},{cy}) => ({X:.2f}, {Y:.2f})" , (cx-40, cy-15),cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 125), 1, cv2.LINE_AA)
-
-      # Store in dictionary
-      point_name = f"P{i}"
-      data[point_name] = {
-            "X": float(X),
-            "Y": float(Y),
-            "cx": cx,
-            "cy": cy
-        }
-   # Save to JSON file
-   with open("output/centroids_data.json", "w") as f:
-      json.dump(data, f, indent=4)
+   if annotate:
+      for (cx, cy), (X, Y) in zip(np.round(points).astype(int).tolist(), world.tolist()):
+         cv2.circle(img_clr, (cx,cy), 2, (191,40,0), 2)
+         cv2.putText(img_clr, f"({cx},{cy}) => ({X:.2f}, {Y:.2f})" , (cx-40, cy-15),cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 125), 1, cv2.LINE_AA)
       
    return img_clr
 
 
-def main():
-    print("Running Object detection module...")
+def main(segmenter=DEFAULT_SEGMENTER):
+    # segmenter: name from background.SEGMENTERS ("fixed" = threshold 120)
+    print(f"Running Object detection module ({segmenter} segmentation)...")
     #CaptureImg('output/captured_img.png',1)
 
     # img = cv2.imread("./output/captured_img.png")
-    img_clr = cv2.imread('./output/captured_img.png')
+    img_clr = Undistort_Frame(cv2.imread('./output/captured_img.png'))
     img = cv2.cvtColor(img_clr, cv2.COLOR_BGR2GRAY)
 
-    H = load_H_Matrix()
-
-    img_clr = object_detection(img,H,img_clr)
+    # H=None: batch conversion through the calibration cache / pixel map
+    img_clr = object_detection(img,None,img_clr,segmenter=Make_Segmenter(segmenter))
 
     save_image(img_clr)
 
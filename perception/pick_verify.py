@@ -0,0 +1,191 @@
+"""
+Pick verification from the vacuum sensor
+
+The cup's vacuum switch is wired to a controller DI, and the feedback
+packet already carries digital_input_bits every cycle, so checking the
+grip costs no extra command. On a miss the part was usually pushed or
+mislocated: only a small ROI around it is re-detected, once the arm no
+longer hides it, and the pick is retried there instead of finding the
+miss after the batch and re-running the whole scene.
+
+Verification is off until VACUUM_SENSOR_DI is set to the DI of the
+switch; without it Verified_Pick runs the plain pick cycle.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from .calibration_cache import Undistort_Frame, World_To_Pixel_Batch
+from .dobot_controller import (
+    GetCurrentPosition,
+    GetDigitalInputs,
+    MoveJ,
+    MoveL,
+    WaitArrive,
+    ControlDigitalOutput,
+)
+from .motion_planner import Plan_Pick_Cycle, Execute_Plan, ARRIVE_TOLERANCE
+from .motion_profiles import Apply_Profiles
+from .mg400_kinematics import Check_Targets
+from . import shape as shape_detector
+
+# ==============================
+# CONFIGURATION
+# ==============================
+
+VACUUM_SENSOR_DI = None   # DI wired to the vacuum switch (1-based); None: picks not verified
+SENSE_TIMEOUT = 0.2       # s for the vacuum to build once the cup is down
+MAX_RETRIES = 2           # re-detect + retry attempts after a miss
+ROI_RADIUS = 40.0         # mm around the missed part that is searched again
+ROI_PADDING = 20          # px added to the projected ROI
+CLEAR_TIMEOUT = 5.0       # s waiting for the arm to uncover the ROI
+POLL_INTERVAL = 0.002     # s between feedback checks
+
+PICKED = "picked"
+MISSED = "missed"
+FAILED = "failed"         # robot did not reach a point, stop the batch
+
+# ==============================
+# VACUUM SENSOR
+# ==============================
+
+def DI_Set(bits, index):
+    return bool((int(bits) >> (index - 1)) & 1)
+
+
+def Wait_Vacuum(index, read_inputs=GetDigitalInputs, timeout=SENSE_TIMEOUT):
+    """
+    Poll the feedback DI bits until the vacuum switch closes
+
+    Returns:
+        bool: True if the part is held
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if DI_Set(read_inputs(), index):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+
+# ==============================
+# ROI RE-DETECTION
+# ==============================
+
+def Wait_ROI_Clear(center, radius=ROI_RADIUS, read_pose=GetCurrentPosition, timeout=CLEAR_TIMEOUT):
+    """Wait until the arm, seen from above, no longer covers the ROI"""
+    from .cycle_scheduler import Arm_Occludes  # cycle_scheduler imports robot_move
+
+    region = (center[0] - radius, center[0] + radius, center[1] - radius, center[1] + radius)
+    deadline = time.monotonic() + timeout
+    while Arm_Occludes(read_pose(), region):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+    return True
+
+
+def Redetect_ROI(frame, center, radius=ROI_RADIUS, color=None, shape=None):
+    """
+    Search for the part again in the pixels around robot XY center
+
+    Returns:
+        tuple or None: (x, y, r) of the matching detection closest to center
+    """
+    x, y = center[:2]
+    corners = [(x - radius, y - radius), (x + radius, y - radius),
+               (x + radius, y + radius), (x - radius, y + radius)]
+    pixels = World_To_Pixel_Batch(corners)
+    box = (*(pixels.min(axis=0) - ROI_PADDING), *(pixels.max(axis=0) + ROI_PADDING))
+
+    objects = shape_detector.Detect_Objects_ROI(frame, box)
+    if color is not None:
+        objects = [obj for obj in objects if obj["color"] == color]
+    if shape is not None:
+        objects = [obj for obj in objects if obj["shape"] == shape]
+    if not objects:
+        return None
+
+    det = shape_detector.Objects_To_Detections(objects, (frame.shape[1], frame.shape[0]))
+    dist = np.hypot(det["X"] - x, det["Y"] - y)
+    i = int(np.argmin(dist))
+    if dist[i] > radius:
+        return None
+    return float(det["X"][i]), float(det["Y"][i]), float(det["R"][i])
+
+
+def Camera_Grabber(camera_index=1):
+    """Returns (grab, release); grab() reads a fresh undistorted frame"""
+    cap = cv2.VideoCapture(camera_index)
+    if not cap.isOpened():
+        raise RuntimeError("Could not open camera.")
+
+    def grab():
+        cap.grab()                 # drop the buffered frame
+        ret, frame = cap.read()
+        if not ret:
+            raise RuntimeError("Failed to grab frame")
+        return Undistort_Frame(frame)
+
+    return grab, cap.release
+
+# ==============================
+# VERIFIED PICK
+# ==============================
+
+def Verified_Pick(move, dashboard, high, low, drop_up, drop, profiles, payload_g,
+                  grab_frame=None, color=None, shape=None, retries=MAX_RETRIES,
+                  sensor_di=VACUUM_SENSOR_DI):
+    """
+    Pick cycle that checks the vacuum switch before lifting
+
+    On a miss the vacuum is released and the arm leaves towards drop_up;
+    as soon as it uncovers the part's ROI, a frame is re-detected there and
+    the pick retried at the new position (only with grab_frame given).
+    With sensor_di None the whole cycle runs unchecked, as a plain
+    Execute_Plan.
+
+    Returns:
+        str: PICKED, MISSED or FAILED
+    """
+    if sensor_di is None:
+        plan = Apply_Profiles(Plan_Pick_Cycle(high, low, drop_up, drop), payload_g, profiles)
+        return PICKED if Execute_Plan(move, dashboard, plan) else FAILED
+
+    for attempt in range(retries + 1):
+
+        plan = Apply_Profiles(Plan_Pick_Cycle(high, low, drop_up, drop), payload_g, profiles)
+
+        # Approach + pick (vacuum on), then check the grip before lifting
+        if not Execute_Plan(move, dashboard, plan[:2]):
+            return FAILED
+
+        if Wait_Vacuum(sensor_di):
+            return PICKED if Execute_Plan(move, dashboard, plan[2:]) else FAILED
+
+        print(f"*** No vacuum at ({low[0]:.1f}, {low[1]:.1f}), attempt {attempt + 1} ***")
+        ControlDigitalOutput(dashboard, output_index=1, status=0)
+
+        MoveL(move, high)
+        if grab_frame is None or attempt == retries:
+            return MISSED if WaitArrive(high, tolerance=ARRIVE_TOLERANCE, timeout=5.0) else FAILED
+
+        MoveJ(move, drop_up)
+        if not Wait_ROI_Clear(low):
+            return FAILED
+
+        found = Redetect_ROI(grab_frame(), low, color=color, shape=shape)
+        if found is None:
+            print("Part not found in its ROI any more")
+            return MISSED
+
+        x, y, r = found
+        high = [x, y, high[2], r]
+        low = [x, y, low[2], r]
+        if not Check_Targets([(high, low)])[0]:
+            print(f"Part moved out of reach to ({x:.1f}, {y:.1f})")
+            return MISSED
+
+    return MISSED
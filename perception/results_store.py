@@ -0,0 +1,241 @@
+"""
+Detection results store
+
+Detections are kept as column arrays in a schema-versioned .npz file that
+is replaced atomically, so a reader in another process (UI, robot) either
+sees the previous complete file or the new complete file, never a partial
+one. Readers load only the columns they ask for.
+
+Every save can also be recorded in a small SQLite index of runs, with an
+optional archived copy of the detections for offline analysis/training.
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+SCHEMA_VERSION = 1
+
+DETECTIONS_PATH = "output/detections.npz"
+CENTROIDS_PATH = "output/centroids.npz"
+INDEX_PATH = "output/runs.sqlite"
+ARCHIVE_DIR = "output/runs"
+
+# Column name -> (dtype, fill value for files written by older schemas)
+DETECTION_FIELDS = {
+    "X": (np.float64, np.nan),
+    "Y": (np.float64, np.nan),
+    "R": (np.float64, 0.0),
+    "cx": (np.float64, np.nan),
+    "cy": (np.float64, np.nan),
+    "area": (np.float64, np.nan),
+    "color": (np.dtype("U16"), ""),
+    "shape": (np.dtype("U16"), ""),
+}
+
+REPLACE_RETRIES = 20
+
+# Mode of a file created by a plain open(): mkstemp would leave 0600
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+# ===============================
+# Atomic File Replacement
+# ===============================
+
+def Atomic_Replace(tmp_path, path):
+    """
+    os.replace with retries: on Windows the target cannot be replaced
+    while a reader still has it open.
+    """
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            if attempt == REPLACE_RETRIES - 1:
+                os.remove(tmp_path)
+                raise
+            time.sleep(0.01)
+
+
+def Save_Arrays_Atomic(path, arrays):
+    """
+    Write a dict of arrays to path (.npz) via a temp file in the same folder
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.chmod(tmp_path, FILE_MODE)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    Atomic_Replace(tmp_path, path)
+
+
+# ===============================
+# Detections
+# ===============================
+
+def Make_Detections(count=0, **columns):
+    """
+    Build a detections dict with every schema column present
+
+    Missing columns are filled with their default value.
+    """
+    detections = {}
+
+    for name, (dtype, fill) in DETECTION_FIELDS.items():
+        if name in columns:
+            detections[name] = np.asarray(columns[name], dtype=dtype)
+        else:
+            detections[name] = np.full(count, fill, dtype=dtype)
+
+    return detections
+
+
+def Save_Detections(detections, path=DETECTIONS_PATH, kind="shape", index=True, archive=False,
+                    extra=None):
+    """
+    Atomically write detections and optionally record the run
+
+    Args:
+        detections: dict of equal-length column arrays (see DETECTION_FIELDS)
+        path: target .npz file
+        kind: producer name stored in the run index ("shape", "centroids", ...)
+        index: record the run in INDEX_PATH
+        archive: also keep a per-run copy under ARCHIVE_DIR
+        extra: dict of additional per-detection arrays stored as-is
+               (e.g. classifier features); read back by name
+
+    Returns:
+        int or None: run id if indexed
+    """
+    count = len(next(iter(detections.values()))) if detections else 0
+    timestamp = time.time()
+
+    arrays = dict(Make_Detections(count, **detections))
+    arrays.update(extra or {})
+    arrays["schema_version"] = np.array(SCHEMA_VERSION)
+    arrays["timestamp"] = np.array(timestamp)
+    arrays["kind"] = np.array(kind)
+
+    Save_Arrays_Atomic(path, arrays)
+
+    if not index:
+        return None
+
+    run_id = Index_Run(kind, path, count, timestamp)
+
+    if archive:
+        archive_path = os.path.join(ARCHIVE_DIR, f"{run_id:06d}_{kind}.npz")
+        Save_Arrays_Atomic(archive_path, arrays)
+        Set_Run_Archive(run_id, archive_path)
+
+    return run_id
+
+
+def Load_Detections(path=DETECTIONS_PATH, fields=None):
+    """
+    Load detection columns
+
+    Args:
+        path: .npz file written by Save_Detections
+        fields: iterable of column names to read (default: all)
+
+    Returns:
+        dict: column name -> numpy array, plus "timestamp"
+    """
+    if fields is None:
+        fields = DETECTION_FIELDS.keys()
+
+    with np.load(path) as data:
+        version = int(data["schema_version"])
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"{path} has schema version {version}, "
+                             f"newer than supported version {SCHEMA_VERSION}")
+
+        count = len(data["X"])
+        result = {"timestamp": float(data["timestamp"])}
+
+        for name in fields:
+            if name in data.files:
+                result[name] = data[name]
+            elif name not in DETECTION_FIELDS:
+                raise KeyError(f"{path} has no column {name!r}")
+            else:
+                dtype, fill = DETECTION_FIELDS[name]
+                result[name] = np.full(count, fill, dtype=dtype)
+
+    return result
+
+
+# ===============================
+# SQLite Run Index
+# ===============================
+
+def Open_Index(path=INDEX_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    con = sqlite3.connect(path, timeout=5.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp REAL NOT NULL,
+            kind TEXT NOT NULL,
+            path TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            schema_version INTEGER NOT NULL,
+            archive TEXT
+        )""")
+    return con
+
+
+def Index_Run(kind, path, count, timestamp, index_path=INDEX_PATH):
+    con = Open_Index(index_path)
+    try:
+        with con:
+            cur = con.execute(
+                "INSERT INTO runs (timestamp, kind, path, count, schema_version) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (timestamp, kind, path, count, SCHEMA_VERSION))
+        return cur.lastrowid
+    finally:
+        con.close()
+
+
+def Set_Run_Archive(run_id, archive_path, index_path=INDEX_PATH):
+    con = Open_Index(index_path)
+    try:
+        with con:
+            con.execute("UPDATE runs SET archive = ? WHERE id = ?", (archive_path, run_id))
+    finally:
+        con.close()
+
+
+def List_Runs(kind=None, limit=50, index_path=INDEX_PATH):
+    """
+    Return the most recent runs as (id, timestamp, kind, path, count, archive)
+    """
+    con = Open_Index(index_path)
+    try:
+        query = "SELECT id, timestamp, kind, path, count, archive FROM runs"
+        params = ()
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        query += " ORDER BY id DESC LIMIT ?"
+        return con.execute(query, params + (limit,)).fetchall()
+    finally:
+        con.close()
@@ -0,0 +1,420 @@
+"""
+Multi-robot orchestration
+
+dobot_controller keeps the state of a single arm in module globals.
+RobotCell is the per-instance equivalent: its own dashboard / move / feed
+connections, feedback thread, pose and lock, so one process can drive
+several MG400 cells. CellScheduler hands targets from one shared detection
+stream to whichever cell is free and can reach them soonest.
+
+SimulatedCell replaces the sockets with a motion-time model
+(motion_profiles.Estimate_Move_Time) for testing the scheduler offline.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .dobot_controller import (
+    ConnectRobot,
+    ReadFeedPacket,
+    SetupRobot,
+    MoveJ,
+    MoveL,
+    ControlDigitalOutput,
+)
+from .motion_planner import Plan_Pick_Cycle, Run_Segments
+from .motion_profiles import Load_Profiles, Apply_Profiles, Estimate_Move_Time
+from .mg400_kinematics import Check_Targets
+from .robot_move import (
+    load_objects,
+    PICK_Z,
+    SAFE_Z_OFFSET,
+    PART_WEIGHT,
+    DROP_POINT,
+    DROP_POINT_UP,
+    ROBOT_IP,
+)
+from .shm_bus import VisionProcess, BUS_NAME
+
+CLAIM_RADIUS = 20.0            # mm, detections this close are the same part
+CLAIM_HOLD = 2.0               # s a picked part stays claimed (stale detections)
+
+# name, controller address and base pose (x, y, yaw_deg) in the shared
+# detection frame of every cell driven by Run_Cells
+CELLS = [
+    {"name": "cell1", "ip": ROBOT_IP, "origin": (0.0, 0.0, 0.0)},
+]
+
+
+# ==============================
+# ROBOT CELL
+# ==============================
+
+class RobotCell:
+    """
+    One MG400 with its own connections and feedback state
+
+    Args:
+        name: label used in logs
+        ip: controller address
+        origin: (x, y, yaw_deg) of this robot's base in the shared
+                detection frame
+        drop_up, drop: [x, y, z, r] drop points in the robot's own frame
+                       (robot_move.DROP_POINT_UP / DROP_POINT by default)
+    """
+
+    def __init__(self, name, ip, origin=(0.0, 0.0, 0.0), drop_up=None, drop=None):
+        self.name = name
+        self.ip = ip
+        self.drop_up = list(DROP_POINT_UP if drop_up is None else drop_up)
+        self.drop = list(DROP_POINT if drop is None else drop)
+
+        yaw = np.radians(origin[2])
+        c, s = np.cos(yaw), np.sin(yaw)
+        # shared frame → robot frame: inverse of [R | t]
+        self.to_robot = np.linalg.inv(np.array([[c, -s, origin[0]],
+                                                [s, c, origin[1]],
+                                                [0, 0, 1.0]]))
+        self.yaw_deg = origin[2]
+
+        self.dashboard = None
+        self.move = None
+        self.feed = None
+        self.pose = None
+        self.digital_inputs = 0
+        self.error = False
+        self.enabled = False
+        self.picks = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._feed_thread = None
+
+    # ------------------------------
+    # Connection
+    # ------------------------------
+
+    def connect(self, timeout_s=5.0, **setup_args):
+        self.dashboard, self.move, self.feed = ConnectRobot(self.ip, timeout_s)
+        self.start_feedback()
+        SetupRobot(self.dashboard, **setup_args)
+        with self._lock:
+            self.error = False     # stale until the next packet after ClearError
+
+    def start_feedback(self):
+        self._stop.clear()
+        self._feed_thread = threading.Thread(target=self._feed_loop, daemon=True,
+                                             name=f"feed-{self.name}")
+        self._feed_thread.start()
+
+    def _feed_loop(self):
+        self.feed.socket_dobot.settimeout(1.0)
+        while not self._stop.is_set():
+            try:
+                info = ReadFeedPacket(self.feed, self._stop.is_set)
+                if info is None:
+                    continue
+                with self._lock:
+                    self.pose = info["tool_vector_actual"][0].copy()
+                    self.digital_inputs = int(info["digital_input_bits"][0])
+                    self.error = bool(info["ErrorStatus"][0])
+                    self.enabled = bool(info["EnableStatus"][0])
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"[{self.name}] Feed Error: {e}")
+                time.sleep(0.1)
+
+    def disconnect(self):
+        self._stop.set()
+        if self._feed_thread is not None:
+            self._feed_thread.join(timeout=2.0)
+        try:
+            self.dashboard.DisableRobot()
+        except Exception:
+            pass
+        for api in (self.dashboard, self.move, self.feed):
+            api.close()
+
+    # ------------------------------
+    # Motion primitives
+    # ------------------------------
+
+    def position(self):
+        with self._lock:
+            return None if self.pose is None else list(self.pose[:4])
+
+    def MoveJ(self, point, *params):
+        MoveJ(self.move, point, *params)
+
+    def MoveL(self, point, *params):
+        MoveL(self.move, point, *params)
+
+    def WaitArrive(self, target_point, tolerance=1.0, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.error:
+                print(f"[{self.name}] Robot error: aborting wait")
+                return False
+            pose = self.position()
+            if pose is not None and np.all(np.abs(np.subtract(pose, target_point[:4])) <= tolerance):
+                return True
+            time.sleep(0.001)
+        print(f"[{self.name}] Timeout: did not reach {target_point} within {timeout}s")
+        return False
+
+    def SetVacuum(self, status):
+        ControlDigitalOutput(self.dashboard, output_index=1, status=status)
+
+    def execute(self, segments):
+        return Run_Segments(segments, self.MoveJ, self.MoveL, self.WaitArrive, self.SetVacuum)
+
+    # ------------------------------
+    # Targets
+    # ------------------------------
+
+    def to_local(self, points, r=None):
+        """(N, 2) shared-frame XY (and R) → robot-frame XY (and R)"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        local = points @ self.to_robot[:2, :2].T + self.to_robot[:2, 2]
+        if r is None:
+            return local
+        return local, np.asarray(r, dtype=np.float64) - self.yaw_deg
+
+    def in_reach(self, local, r):
+        """Mask of robot-frame targets whose high and low poses are reachable"""
+        targets = [([x, y, PICK_Z + SAFE_Z_OFFSET, a], [x, y, PICK_Z, a])
+                   for (x, y), a in zip(local, r)]
+        return Check_Targets(targets)
+
+    def pick(self, x, y, r, profiles, payload_g=PART_WEIGHT):
+        """Blocking pick cycle at robot-frame (x, y, r)"""
+        high = [x, y, PICK_Z + SAFE_Z_OFFSET, r]
+        low = [x, y, PICK_Z, r]
+        plan = Apply_Profiles(Plan_Pick_Cycle(high, low, self.drop_up, self.drop),
+                              payload_g, profiles)
+        ok = self.execute(plan)
+        if ok:
+            self.picks += 1
+        return ok
+
+
+class SimulatedCell(RobotCell):
+    """
+    RobotCell without hardware: queued moves complete after their
+    estimated motion time (scaled by time_scale), the pose jumps on arrival
+    """
+
+    def __init__(self, name, origin=(0.0, 0.0, 0.0), drop_up=None, drop=None,
+                 home=(350.0, 0.0, 0.0, 0.0), time_scale=1.0):
+        super().__init__(name, "sim", origin, drop_up, drop)
+        self.pose = np.array(home, dtype=np.float64)
+        self.time_scale = time_scale
+        self._queue = queue.Queue()
+
+    def connect(self, timeout_s=5.0, **setup_args):
+        self.start_feedback()
+
+    def _feed_loop(self):
+        while not self._stop.is_set():
+            try:
+                point, speed, acc = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            duration = Estimate_Move_Time(self.position(), point, speed, acc)
+            time.sleep(duration * self.time_scale)
+            with self._lock:
+                self.pose = np.array(point[:4], dtype=np.float64)
+
+    def disconnect(self):
+        self._stop.set()
+        if self._feed_thread is not None:
+            self._feed_thread.join(timeout=2.0)
+
+    def _queue_move(self, point, params):
+        ratios = {"Speed": 50, "Acc": 50}
+        for param in params:
+            key, _, value = param.partition("=")
+            for prefix in ratios:
+                if key.startswith(prefix):
+                    ratios[prefix] = int(value)
+        self._queue.put((list(point), ratios["Speed"], ratios["Acc"]))
+
+    def MoveJ(self, point, *params):
+        self._queue_move(point, params)
+
+    def MoveL(self, point, *params):
+        self._queue_move(point, params)
+
+    def SetVacuum(self, status):
+        pass
+
+
+# ==============================
+# SHARED SCHEDULER
+# ==============================
+
+class CellScheduler:
+    """
+    Dispatch targets from one detection stream to several cells
+
+    Each free cell gets the unclaimed target in its reach with the
+    shortest estimated approach time from its current pose; cells run
+    their pick cycles concurrently on a thread pool.
+    """
+
+    def __init__(self, cells, payload_g=PART_WEIGHT):
+        self.cells = list(cells)
+        self.payload_g = payload_g
+        self.profiles = Load_Profiles()
+
+        self._pool = ThreadPoolExecutor(max_workers=len(self.cells), thread_name_prefix="cell")
+        self._busy = {}          # cell name → Future
+        self._claims = []        # [x, y, expiry or None while picking]
+        self._claims_lock = threading.Lock()
+
+    def _claimed(self, points, now):
+        with self._claims_lock:
+            self._claims = [c for c in self._claims if c[2] is None or c[2] > now]
+            if not self._claims:
+                return np.zeros(len(points), dtype=bool)
+            claims = np.array([c[:2] for c in self._claims])
+        dist = np.linalg.norm(points[:, None, :] - claims[None, :, :], axis=2)
+        return (dist < CLAIM_RADIUS).any(axis=1)
+
+    def _run_pick(self, cell, claim, x, y, r):
+        try:
+            return cell.pick(x, y, r, self.profiles, self.payload_g)
+        finally:
+            with self._claims_lock:
+                claim[2] = time.monotonic() + CLAIM_HOLD
+
+    def dispatch(self, detections):
+        """
+        Assign targets to the free cells
+
+        Args:
+            detections: dict with "X", "Y", "R" columns in the shared frame
+
+        Returns:
+            int: number of picks started
+        """
+        points = np.column_stack([detections["X"], detections["Y"]]).astype(np.float64)
+        r = np.asarray(detections["R"], dtype=np.float64)
+        if len(points) == 0:
+            return 0
+
+        now = time.monotonic()
+        free = ~self._claimed(points, now)
+        started = 0
+
+        for cell in self.cells:
+            future = self._busy.get(cell.name)
+            if future is not None and not future.done():
+                continue
+
+            local, local_r = cell.to_local(points, r)
+            candidates = np.flatnonzero(free & cell.in_reach(local, local_r))
+            pose = cell.position()
+            if len(candidates) == 0 or pose is None:
+                continue
+
+            # Empty approach at transit speed: straight-line time estimate
+            times = [Estimate_Move_Time(pose, [*local[i], PICK_Z + SAFE_Z_OFFSET],
+                                        self.profiles["transit"]["speed"],
+                                        self.profiles["transit"]["acc"])
+                     for i in candidates]
+            i = candidates[int(np.argmin(times))]
+
+            claim = [points[i, 0], points[i, 1], None]
+            with self._claims_lock:
+                self._claims.append(claim)
+            free[i] = False
+
+            self._busy[cell.name] = self._pool.submit(
+                self._run_pick, cell, claim, float(local[i, 0]), float(local[i, 1]),
+                float(local_r[i]))
+            started += 1
+
+        return started
+
+    def run(self, source, duration=None, poll=0.01):
+        """
+        Dispatch from source() (detections dict) until duration elapses or
+        the scene stays empty with every cell idle
+
+        Returns:
+            float: aggregate picks per hour
+        """
+        start = time.monotonic()
+        while duration is None or time.monotonic() - start < duration:
+            detections = source()
+            self.dispatch(detections)
+
+            idle = all(f.done() for f in self._busy.values())
+            if idle and len(detections["X"]) == 0:
+                break
+            time.sleep(poll)
+
+        for future in self._busy.values():
+            future.result()
+
+        elapsed = time.monotonic() - start
+        picks = sum(cell.picks for cell in self.cells)
+        rate = picks / elapsed * 3600 if elapsed > 0 else 0.0
+        print(f"{picks} picks in {elapsed:.1f}s ({rate:.0f}/h): "
+              + ", ".join(f"{cell.name}={cell.picks}" for cell in self.cells))
+        return rate
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+# ==============================
+# ENTRY POINT
+# ==============================
+
+def Run_Cells(cells=CELLS, camera_index=1, bus_name=BUS_NAME, duration=None, simulate=False,
+              payload_g=PART_WEIGHT):
+    """
+    Start the vision process on a shared-memory bus and drive the
+    configured cells from its detections
+
+    Args:
+        cells: list of {"name", "ip", "origin"[, "drop_up", "drop"]}
+        camera_index: capture source of the vision process
+        simulate: SimulatedCell instead of the real controllers
+
+    Returns:
+        float: aggregate picks per hour
+    """
+    vision = VisionProcess(camera_index, bus_name).start()
+
+    robot_cells = []
+    for config in cells:
+        drops = (config.get("drop_up"), config.get("drop"))
+        if simulate:
+            robot_cells.append(SimulatedCell(config["name"], config["origin"], *drops))
+        else:
+            robot_cells.append(RobotCell(config["name"], config["ip"], config["origin"], *drops))
+
+    scheduler = None
+    try:
+        if not vision.wait_detections():
+            print("Vision process did not publish any detections")
+            return 0.0
+
+        for cell in robot_cells:
+            cell.connect(speed_ratio=50, acc_ratio=50)
+        scheduler = CellScheduler(robot_cells, payload_g)
+        return scheduler.run(lambda: load_objects(("X", "Y", "R"), bus=vision.bus), duration)
+    finally:
+        if scheduler is not None:
+            scheduler.close()
+        for cell in robot_cells:
+            if cell.dashboard is not None or simulate:
+                cell.disconnect()
+        vision.stop()
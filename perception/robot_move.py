@@ -13,8 +13,16 @@ from .dobot_controller import (
     DisconnectRobot
 )
 
+from .motion_profiles import Load_Profiles, Validate_Profiles
+from .mg400_kinematics import Check_Targets, Order_By_Travel_Time
+from .pick_verify import Verified_Pick, Camera_Grabber, PICKED, FAILED, VACUUM_SENSOR_DI
+from .alarms import AlarmMonitor
+from .results_store import DETECTIONS_PATH, Load_Detections, Make_Detections
+
 from time import sleep
+import numpy as np
 import json
+import os
 
 
 # ==============================
@@ -29,38 +37,61 @@ DROP_POINT_UP = [227, -243, -20, -83]
 SAFE_Z_OFFSET = 60        # distance above object
 PICK_Z = -167             # object surface height
 
+PART_WEIGHT = 50          # g, scales the loaded-move profile
+
 
 # ==============================
-# LOAD OBJECTS FROM VISION JSON
+# LOAD OBJECTS FROM VISION RESULTS
 # ==============================
 
-def load_objects():
+def load_objects(fields=("X", "Y", "R", "color", "shape"), bus=None):
+    """
+    Returns detection columns from the shared-memory bus if given,
+    else from the results store, falling back to the legacy world_points.json
+    """
+    if bus is not None:
+        _, detections = bus.read_detections()
+        return detections
+
+    if os.path.exists(DETECTIONS_PATH):
+        return Load_Detections(DETECTIONS_PATH, fields)
+
     with open("output/world_points.json", "r") as f:
-        return json.load(f)
+        points = list(json.load(f).values())
+
+    columns = {name: [p.get(name, 0) for p in points] for name in fields}
+    return Make_Detections(len(points), **columns)
 
 
-def get_targets(selected_color=None, selected_shape=None):
+def get_targets(selected_color=None, selected_shape=None, bus=None):
     """
     Returns list of (high_point, low_point) tuples
     filtered by color and/or shape
     """
-    data = load_objects()
+    data = load_objects(bus=bus)
     targets = []
 
-    for key, point in data.items():
+    selected = np.ones(len(data["X"]), dtype=bool)
+    if selected_color is not None:
+        selected &= data["color"] == selected_color
+    if selected_shape is not None:
+        selected &= data["shape"] == selected_shape
 
-        color_match = (selected_color is None) or (point["color"] == selected_color)
-        shape_match = (selected_shape is None) or (point["shape"] == selected_shape)
+    for x, y, r in zip(data["X"][selected], data["Y"][selected], data["R"][selected]):
 
-        if color_match and shape_match:
+        x, y, r = float(x), float(y), float(r)
 
-            x = point["X"]
-            y = point["Y"]
+        high_point = [x, y, PICK_Z + SAFE_Z_OFFSET, r]
+        low_point = [x, y, PICK_Z, r]
 
-            high_point = [x, y, PICK_Z + SAFE_Z_OFFSET, 0]
-            low_point = [x, y, PICK_Z, 0]
+        targets.append((high_point, low_point))
 
-            targets.append((high_point, low_point))
+    # Drop targets outside the joint limits / in a forbidden zone before
+    # anything is sent (they would only run into the WaitArrive timeout)
+    reachable = Check_Targets(targets)
+    if not reachable.all():
+        print(f"Skipping {int((~reachable).sum())} unreachable target(s)")
+        targets = [t for t, ok in zip(targets, reachable) if ok]
 
     return targets
 
@@ -112,20 +143,32 @@ dashboard = None
 move = None
 feed = None
 feed_thread = None
+alarm_monitor = None
 
 def connection():
-    global dashboard, move, feed, feed_thread
+    global dashboard, move, feed, feed_thread, alarm_monitor
     print("Running Robot Move Program .....")
     
     dashboard, move, feed = ConnectRobot(ip=ROBOT_IP, timeout_s=5.0)
     feed_thread = StartFeedbackThread(feed)
+    alarm_monitor = AlarmMonitor(dashboard).start()
     SetupRobot(dashboard, speed_ratio=50, acc_ratio=50)
     print("Robot connected successfully!")
 
 def DisconnectConnection():
+    if alarm_monitor is not None:
+        alarm_monitor.stop()
     DisconnectRobot(dashboard, move, feed, feed_thread)
 
-def main(color=None,shape=None):
+def main(color=None,shape=None,camera_index=None,vacuum_sensor_di=VACUUM_SENSOR_DI):
+    """
+    camera_index: camera used to re-detect a missed part in its ROI and
+                  retry; None only reports misses
+    vacuum_sensor_di: DI of the vacuum switch; None runs the pick cycles
+                      without checking the grip
+    """
+
+    release = None
 
     try:
         # Get selection from app buttons (CHANGE HERE)
@@ -141,28 +184,43 @@ def main(color=None,shape=None):
             DisconnectConnection()
             return
 
+        # Per-segment speed profiles, checked against the cup's holding force
+        profiles = Load_Profiles()
+        Validate_Profiles(profiles, PART_WEIGHT)
+
+        # Every cycle starts from above the drop point: nearest targets first
+        targets, travel = Order_By_Travel_Time(targets, DROP_POINT_UP)
+
+        grab_frame = None
+        if camera_index is not None:
+            grab_frame, release = Camera_Grabber(camera_index)
+
         # Move to Home first
-        moveToPosition(move, HOME_POINT, dashboard, 0)
+        if not moveToPosition(move, HOME_POINT, dashboard, 0):
+            DisconnectConnection()
+            return
+
+        missed = 0
 
         # =========================
         # PICK AND PLACE LOOP
         # =========================
         for i, (high, low) in enumerate(targets):
 
-            print(f"\nPicking object {i+1}")
+            print(f"\nPicking object {i+1} (approach {travel[i]:.2f}s)")
 
-            # Approach
-            moveToPosition(move, high, dashboard, 0)
-            # Pick (vacuum ON)
-            moveToPosition(move, low, dashboard, 1)
-            # Lift
-            moveToPosition(move, high, dashboard, 1)
-            # Move to drop
-            moveToPosition(move, DROP_POINT_UP, dashboard, 1)
-            moveToPosition(move, DROP_POINT, dashboard, 0)
+            # Vacuum switch checked before lifting; misses re-detected and retried
+            result = Verified_Pick(move, dashboard, high, low, DROP_POINT_UP, DROP_POINT,
+                                   profiles, PART_WEIGHT, grab_frame,
+                                   selected_color, selected_shape,
+                                   sensor_di=vacuum_sensor_di)
+            if result == FAILED:
+                break
+            if result != PICKED:
+                missed += 1
 
-            # Leave drop area safely
-            moveToPosition(move, DROP_POINT_UP, dashboard, 0)
+        if missed:
+            print(f"\n{missed} object(s) could not be picked")
 
         # Return Home after finishing
         moveToPosition(move, HOME_POINT, dashboard, 0)   
@@ -175,6 +233,10 @@ def main(color=None,shape=None):
         print(f"\nERROR: {e}")
         DisconnectConnection()
 
+    finally:
+        if release is not None:
+            release()
+
 
 if __name__ == "__main__":
     main()
@@ -2,7 +2,15 @@ import cv2
 import numpy as np
 import json
 import os
-import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .calibration_cache import H_CACHE, Pixel_To_World_Batch, Undistort_Frame
+from .classifier import RULE_ENGINE, Color_Stats
+from .frame_arena import FrameArena, Get_Kernel
+from .grasp import Compute_Grasp_Poses
+from .results_store import DETECTIONS_PATH, Save_Detections
+from .shape_features import F, Classify_Shapes, Extract_Features
 
 # ===============================
 # Global Variables
@@ -26,57 +34,70 @@ COLOR_RANGES = {
 # Load Homography Matrix
 # ===============================
 
-def load_H_Matrix(path="output/H_matrix.json"):
-    if not os.path.exists(path):
-        print("H_matrix.json not found!")
-        sys.exit(1)
-
-    with open(path, "r") as f:
-        H = np.array(json.load(f), dtype=np.float64)
-
-    return H
-
-H_MATRIX = load_H_Matrix()
+def load_H_Matrix():
+    # Cached; reloaded automatically when H_matrix.json changes
+    return H_CACHE.get()
 
 # ===============================
 # Pixel to World Conversion
 # ===============================
 
-def Pixel_To_World(cx, cy):
+def Pixel_To_World(cx, cy, image_size=None):
 
-    pixel = np.array([cx, cy, 1.0], dtype=np.float64)
-    world = H_MATRIX @ pixel
+    X, Y = Pixel_To_World_Batch([(cx, cy)], image_size)[0]
 
-    if world[2] == 0:
+    if not (np.isfinite(X) and np.isfinite(Y)):
         return None, None
 
-    X = world[0] / world[2]
-    Y = world[1] / world[2]
-
     return float(X), float(Y)
 
 # ===============================
 # Create Color Mask
 # ===============================
 
-def Create_Color_Mask(hsv, color):
+# Bounds as arrays once, not per call
+COLOR_BOUNDS = {
+    color: [np.array(bound, dtype=np.uint8) for bound in ranges]
+    for color, ranges in COLOR_RANGES.items()
+}
+
+def Create_Color_Mask(hsv, color, kernel_size=5, dst=None, arena=None):
+    """
+    Threshold hsv for color and clean the mask up with close/open/median.
 
-    ranges = COLOR_RANGES[color]
+    dst: optional uint8 (H, W) output array.
+    arena: optional FrameArena for the intermediate masks; buffers are
+           named per color so different colors never share one.
+    """
+
+    if arena is None:
+        arena = FrameArena()
+
+    size = hsv.shape[:2]
+    if dst is None:
+        dst = arena.get(f"mask_{color}", size)
+    work = arena.get(f"mask_{color}_work", size)
+
+    bounds = COLOR_BOUNDS[color]
 
     if color == 'red':
-        l1, u1, l2, u2 = ranges
-        mask = cv2.inRange(hsv, np.array(l1), np.array(u1)) | \
-               cv2.inRange(hsv, np.array(l2), np.array(u2))
+        l1, u1, l2, u2 = bounds
+        cv2.inRange(hsv, l1, u1, dst=work)
+        cv2.inRange(hsv, l2, u2, dst=dst)
+        cv2.bitwise_or(work, dst, dst=work)
     else:
-        lower, upper = ranges
-        mask = cv2.inRange(hsv, np.array(lower), np.array(upper))
-
-    kernel = np.ones((5, 5), np.uint8)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-    mask = cv2.medianBlur(mask, 5)
+        lower, upper = bounds
+        cv2.inRange(hsv, lower, upper, dst=work)
+
+    if kernel_size > 1:
+        kernel = Get_Kernel(kernel_size)
+        cv2.morphologyEx(work, cv2.MORPH_CLOSE, kernel, dst=dst)
+        cv2.morphologyEx(dst, cv2.MORPH_OPEN, kernel, dst=work)
+        cv2.medianBlur(work, kernel_size, dst=dst)
+    else:
+        np.copyto(dst, work)
 
-    return mask
+    return dst
 
 # ===============================
 # Shape Classification
@@ -84,126 +105,406 @@ def Create_Color_Mask(hsv, color):
 
 def Classify_Shape(contour):
 
-    perimeter = cv2.arcLength(contour, True)
-    approx = cv2.approxPolyDP(contour, 0.02 * perimeter, True)
-    vertices = len(approx)
+    return str(Classify_Shapes(Extract_Features([contour]))[0])
 
-    area = cv2.contourArea(contour)
-    circularity = 4 * np.pi * area / (perimeter ** 2) if perimeter > 0 else 0
+# ===============================
+# Preprocess Image
+# ===============================
 
-    if 0.80 < circularity <= 1.2:
-        return "circle"
+V_TRUNC = 240
+
+BLUR_KSIZE = 7
+SEPARABLE_KERNEL = cv2.getGaussianKernel(BLUR_KSIZE, 0)
+
+# Buffers reused by Detect_Objects from frame to frame, one arena per
+# thread so concurrent detections never share a dst buffer
+_THREAD_ARENAS = threading.local()
+
+def Default_Arena():
+    """FrameArena of the calling thread"""
+    arena = getattr(_THREAD_ARENAS, "arena", None)
+    if arena is None:
+        arena = _THREAD_ARENAS.arena = FrameArena()
+    return arena
+
+def Preprocess_HSV(image, blur="gaussian", arena=None, dst=None):
+    """
+    Blur, convert to HSV and truncate V at V_TRUNC.
+
+    blur: "gaussian" (7x7), "separable" (precomputed 1-D Gaussian),
+          "box" (7x7 mean) or "none".
+    arena: optional FrameArena holding the intermediate blur buffer.
+    dst: optional HSV output array; taken from the arena if omitted, in
+         which case it is overwritten by the next call sharing the arena.
+    """
+
+    if arena is None:
+        arena = FrameArena()
+
+    blurred = arena.get("blurred", image.shape)
+
+    if blur == "gaussian":
+        cv2.GaussianBlur(image, (BLUR_KSIZE, BLUR_KSIZE), 0, dst=blurred)
+    elif blur == "separable":
+        cv2.sepFilter2D(image, -1, SEPARABLE_KERNEL, SEPARABLE_KERNEL, dst=blurred)
+    elif blur == "box":
+        cv2.blur(image, (BLUR_KSIZE, BLUR_KSIZE), dst=blurred)
+    elif blur == "none":
+        blurred = image
+    else:
+        raise ValueError(f"Unknown blur mode: {blur}")
 
-    if vertices == 3:
-        return "triangle"
+    hsv = arena.get("hsv", image.shape) if dst is None else dst
+    cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV, dst=hsv)
 
-    if vertices == 4:
-        x, y, w, h = cv2.boundingRect(approx)
-        aspect_ratio = w / float(h)
-        return "square" if 0.9 <= aspect_ratio <= 1.1 else "rectangle"
+    # Reduce reflections: truncate V in place, no split/merge copies
+    v = hsv[:, :, 2]
+    np.minimum(v, V_TRUNC, out=v)
 
-    return "polygon"
+    return hsv
 
 # ===============================
-# Detect Objects
+# Build Objects From Contours
 # ===============================
 
-def Detect_Objects(image):
+MIN_SOLIDITY = 0.85
+
+def Build_Objects(contours, color_names, detected_centers, engine=None, hsv=None,
+                  offset=(0, 0), arena=None):
+    """
+    Filter and classify a batch of contours through one feature table.
+
+    color_names: mask color of each contour.
+    detected_centers: centers already accepted; extended in place, and a
+                      contour within 30 px of one of them is dropped.
+    engine: classifier.RuleEngine (default) / KnnEngine, called once
+            for all candidates.
+    hsv: HSV image the contours were found in; when given, per-object
+         color statistics are computed (offset: its origin in the frame).
+    arena: optional FrameArena for the color statistics mask.
+    """
+
+    if engine is None:
+        engine = RULE_ENGINE
+
+    features = Extract_Features(contours, area_range=(MIN_AREA, MAX_AREA))
+    area = features[:, F["area"]]
+
+    keep = np.flatnonzero((MIN_AREA < area) & (area < MAX_AREA) &
+                          (features[:, F["m00"]] != 0) &
+                          (features[:, F["solidity"]] >= MIN_SOLIDITY))
+
+    candidates = [contours[i] for i in keep]
+    mask_colors = [color_names[i] for i in keep]
+    color_stats = None
+    if hsv is not None:
+        color_stats = Color_Stats(hsv, candidates, offset, arena)
+
+    colors, shapes = engine.classify(features[keep], color_stats, mask_colors)
 
     objects = []
-    detected_centers = []
 
-    blurred = cv2.GaussianBlur(image, (7, 7), 0)
-    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+    for j, i in enumerate(keep):
+
+        # Sub-pixel centroid, kept as float all the way to the homography
+        cx, cy = float(features[i, F["cx"]]), float(features[i, F["cy"]])
+
+        if any(np.hypot(cx - x, cy - y) < 30 for x, y in detected_centers):
+            continue
+
+        # Long-side angle; second moments are isotropic for squares
+        _, (rect_w, rect_h), rect_angle = cv2.minAreaRect(contours[i])
+        if rect_w < rect_h:
+            rect_angle += 90
+
+        obj = {
+            "center": (cx, cy),
+            "color": str(colors[j]),
+            "shape": str(shapes[j]),
+            "area": float(area[i]),
+            "mu": tuple(features[i, [F["mu20"], F["mu11"], F["mu02"]]]),
+            "rect_angle": np.radians(rect_angle),
+            "mask_color": mask_colors[j],
+            "features": features[i],
+            "contour": contours[i]
+        }
+        if color_stats is not None:
+            obj["color_stats"] = color_stats[j]
+
+        objects.append(obj)
+        detected_centers.append((cx, cy))
+
+    return objects
+
+# ===============================
+# Detect Objects
+# ===============================
+
+def Find_Color_Contours(hsv, color_name, arena=None):
+
+    mask = Create_Color_Mask(hsv, color_name, arena=arena)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    return contours
+
+def Detect_Objects(image, pyramid_levels=0, blur="gaussian", arena=None, parallel=False,
+                   engine=None, color_stats=False):
+    """
+    engine: classifier engine (default classifier.RULE_ENGINE).
+    color_stats: attach per-object HSV statistics even if the engine does
+                 not need them (to archive training samples).
+    """
+
+    with_stats = color_stats or getattr(engine, "uses_color_stats", False)
+
+    if pyramid_levels > 0:
+        return Detect_Objects_Pyramid(image, pyramid_levels, blur, engine, with_stats)
+
+    if arena is None:
+        arena = Default_Arena()
+
+    hsv = Preprocess_HSV(image, blur, arena)
+
+    colors = list(COLOR_RANGES.keys())
+
+    if parallel:
+        contours_per_color = Find_Contours_Parallel(hsv, colors, arena)
+    else:
+        contours_per_color = [Find_Color_Contours(hsv, c, arena) for c in colors]
+
+    # Merge in COLOR_RANGES order so duplicate suppression is deterministic
+    contours = [c for per_color in contours_per_color for c in per_color]
+    color_names = [color for color, per_color in zip(colors, contours_per_color)
+                   for _ in per_color]
+
+    return Build_Objects(contours, color_names, [], engine, hsv if with_stats else None,
+                         arena=arena)
+
+# ===============================
+# Parallel Mask Stage
+# ===============================
+
+# inRange, morphologyEx, medianBlur and findContours all release the GIL,
+# so the per-color work scales over threads.
+MASK_POOL = None
+MASK_POOL_LOCK = threading.Lock()
 
-    h, s, v = cv2.split(hsv)
-    v = cv2.threshold(v, 240, 240, cv2.THRESH_TRUNC)[1]
-    hsv = cv2.merge([h, s, v])
+def Configure_Mask_Pool(workers=None, opencv_threads="auto"):
+    """
+    (Re)create the persistent mask thread pool.
+
+    workers: pool size, defaults to min(#colors, #cores).
+    opencv_threads: cv2.setNumThreads value (process-wide). "auto" caps
+                    OpenCV at the cores left per worker whenever the pool
+                    has more than one, so its own pool does not
+                    oversubscribe; None leaves it unchanged.
+    """
+
+    with MASK_POOL_LOCK:
+        return _Replace_Mask_Pool(workers, opencv_threads)
+
+def _Replace_Mask_Pool(workers, opencv_threads):
+    # Caller holds MASK_POOL_LOCK
+
+    global MASK_POOL
+
+    cores = os.cpu_count() or 1
+    if workers is None:
+        workers = min(len(COLOR_RANGES), cores)
+    if opencv_threads == "auto":
+        opencv_threads = max(1, cores // workers) if workers > 1 else None
+
+    # Work already submitted to the old pool still completes
+    if MASK_POOL is not None:
+        MASK_POOL.shutdown(wait=False)
+
+    if opencv_threads is not None:
+        cv2.setNumThreads(opencv_threads)
+    MASK_POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mask")
+
+    return MASK_POOL
+
+def Find_Contours_Parallel(hsv, colors, arena=None):
+    """
+    Run Find_Color_Contours for every color on MASK_POOL.
+
+    Returns the contour lists in the order of colors.
+    """
+
+    if arena is None:
+        arena = FrameArena()
+
+    # Created and submitted to under the lock: concurrent first calls share
+    # one pool, and a reconfigure cannot shut it down between submissions
+    with MASK_POOL_LOCK:
+        if MASK_POOL is None:
+            _Replace_Mask_Pool(None, "auto")
+        futures = [MASK_POOL.submit(Find_Color_Contours, hsv, color, arena) for color in colors]
+
+    return [future.result() for future in futures]
+
+# ===============================
+# Coarse-to-Fine Detection
+# ===============================
+
+PYRAMID_ROI_PADDING = 12  # full-resolution pixels around each candidate
+
+def Find_Coarse_Candidates(image, levels, blur="gaussian"):
+    """
+    Segment a pyrDown'ed copy of the image and return candidate
+    (color, x, y, w, h) boxes scaled back to full resolution.
+    """
+
+    small = image
+    for _ in range(levels):
+        small = cv2.pyrDown(small)
+
+    scale = 2 ** levels
+    min_area = MIN_AREA / (scale * scale)
+    max_area = MAX_AREA / (scale * scale)
+
+    # Small objects would vanish under the full-size 5x5 morphology
+    kernel_size = 3 if levels == 1 else 1
+
+    hsv = Preprocess_HSV(small, blur)
+    candidates = []
 
     for color_name in COLOR_RANGES.keys():
 
-        mask = Create_Color_Mask(hsv, color_name)
+        mask = Create_Color_Mask(hsv, color_name, kernel_size)
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
         for contour in contours:
 
+            # Loose bound: the coarse area is only an estimate
             area = cv2.contourArea(contour)
-            if not (MIN_AREA < area < MAX_AREA):
+            if not (0.5 * min_area < area < 2.0 * max_area):
                 continue
 
-            M = cv2.moments(contour)
-            if M["m00"] == 0:
-                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            candidates.append((color_name, x * scale, y * scale, w * scale, h * scale))
 
-            cx = int(M["m10"] / M["m00"])
-            cy = int(M["m01"] / M["m00"])
+    return candidates
 
-            if any(np.hypot(cx - x, cy - y) < 30 for x, y in detected_centers):
-                continue
+def Detect_Objects_Pyramid(image, levels=1, blur="gaussian", engine=None, color_stats=False):
+    """
+    Coarse-to-fine variant of Detect_Objects: candidates are found on a
+    downscaled pyramid level, then contour and centroid are refined in a
+    full-resolution ROI so Pixel_To_World keeps full precision.
+    """
 
-            hull = cv2.convexHull(contour)
-            hull_area = cv2.contourArea(hull)
-            if hull_area == 0 or area / hull_area < 0.85:
-                continue
+    objects = []
+    detected_centers = []
+
+    img_h, img_w = image.shape[:2]
+    pad = PYRAMID_ROI_PADDING + 2 ** levels
+
+    for color_name, x, y, w, h in Find_Coarse_Candidates(image, levels, blur):
 
-            shape = Classify_Shape(contour)
+        x0, y0 = max(x - pad, 0), max(y - pad, 0)
+        x1, y1 = min(x + w + pad, img_w), min(y + h + pad, img_h)
 
-            objects.append({
-                "center": (cx, cy),
-                "color": color_name,
-                "shape": shape,
-                "area": area,
-                "contour": contour
-            })
+        hsv = Preprocess_HSV(image[y0:y1, x0:x1], blur)
+        mask = Create_Color_Mask(hsv, color_name)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                       offset=(x0, y0))
+
+        if not contours:
+            continue
 
-            detected_centers.append((cx, cy))
+        # The candidate is the dominant blob of its ROI
+        contour = max(contours, key=cv2.contourArea)
+
+        objects.extend(Build_Objects([contour], [color_name], detected_centers, engine,
+                                     hsv if color_stats else None, (x0, y0)))
 
     return objects
 
+# ===============================
+# ROI Re-Detection
+# ===============================
+
+def Detect_Objects_ROI(image, box, blur="gaussian", engine=None):
+    """
+    Detect_Objects restricted to box = (x0, y0, x1, y1) pixels, with
+    contours and centers returned in full-frame coordinates.
+    """
+
+    img_h, img_w = image.shape[:2]
+    x0, y0 = max(int(box[0]), 0), max(int(box[1]), 0)
+    x1, y1 = min(int(np.ceil(box[2])), img_w), min(int(np.ceil(box[3])), img_h)
+    if x1 <= x0 or y1 <= y0:
+        return []
+
+    hsv = Preprocess_HSV(image[y0:y1, x0:x1], blur)
+
+    contours, color_names = [], []
+    for color_name in COLOR_RANGES.keys():
+        mask = Create_Color_Mask(hsv, color_name)
+        found, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                    offset=(x0, y0))
+        contours.extend(found)
+        color_names.extend([color_name] * len(found))
+
+    return Build_Objects(contours, color_names, [], engine)
+
 # ===============================
 # Save World Coordinates JSON
 # ===============================
 
-def Save_World_Coordinates(objects, filename="output/world_points.json"):
+def Save_World_Coordinates(objects, filename=DETECTIONS_PATH, image_size=None, archive=False):
 
     # Sort left → right (robot friendly)
     objects = sorted(objects, key=lambda obj: obj["center"][0])
 
-    data = {}
-
-    for i, obj in enumerate(objects):
+    # Archived runs keep the classifier inputs for offline training
+    extra = None
+    if archive and objects and all("color_stats" in obj for obj in objects):
+        extra = {
+            "features": np.array([obj["features"] for obj in objects]).reshape(len(objects), -1),
+            "color_stats": np.array([obj["color_stats"] for obj in objects]).reshape(len(objects), -1),
+            "mask_color": np.array([obj["mask_color"] for obj in objects], dtype="U16"),
+        }
 
-        cx, cy = obj["center"]
-        X, Y = Pixel_To_World(cx, cy)
+    return Save_Detections(Objects_To_Detections(objects, image_size), filename, kind="shape",
+                           archive=archive, extra=extra)
 
-        if X is None:
-            continue
+# ===============================
+# Objects to Detection Columns
+# ===============================
 
-        key = f"P{i+1}"
+def Objects_To_Detections(objects, image_size=None):
 
-        data[key] = {
-            "X": X,
-            "Y": Y,
-            "cx": int(cx),
-            "cy": int(cy),
-            "color": obj["color"],
-            "shape": obj["shape"]
-        }
+    poses = Compute_Grasp_Poses(
+        objects, to_world=lambda points: Pixel_To_World_Batch(points, image_size))
+    centers = np.array([obj["center"] for obj in objects], dtype=np.float64).reshape(-1, 2)
 
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
+    return {
+        "X": poses[:, 0],
+        "Y": poses[:, 1],
+        "R": poses[:, 2],
+        "cx": centers[:, 0],
+        "cy": centers[:, 1],
+        "area": [obj["area"] for obj in objects],
+        "color": [obj["color"] for obj in objects],
+        "shape": [obj["shape"] for obj in objects],
+    }
 
 # ===============================
 # Annotate Image
 # ===============================
 
-def Annotate_Image(image, objects):
+def Annotate_Image(image, objects, dst=None):
 
-    annotated = image.copy()
+    if dst is None:
+        annotated = image.copy()
+    else:
+        annotated = dst
+        np.copyto(annotated, image)
 
     for obj in objects:
 
-        cx, cy = obj["center"]
+        cx, cy = (int(round(c)) for c in obj["center"])
 
         cv2.drawContours(annotated, [obj["contour"]], -1, (0, 255, 0), 2)
         cv2.circle(annotated, (cx, cy), 5, (0, 255, 0), -1)
@@ -228,12 +529,14 @@ def main():
         print("Image not found.")
         return
 
+    image = Undistort_Frame(image)
+
     objects = Detect_Objects(image)
 
     annotated = Annotate_Image(image, objects)
     cv2.imwrite("output/Color_Shape.png", annotated)
 
-    Save_World_Coordinates(objects)
+    Save_World_Coordinates(objects, image_size=(image.shape[1], image.shape[0]))
 
     cv2.imshow("Detected Objects", annotated)
     cv2.waitKey(0)
@@ -0,0 +1,109 @@
+"""
+Contour feature table and vectorized shape classification
+
+Every geometric quantity the detectors need (area, moments, perimeter,
+hull solidity, bounding-box aspect ratios, polygon vertex count) is
+computed once per contour into one (N, len(FEATURE_COLUMNS)) float64 table.
+Filtering and shape classification are then whole-column numpy passes
+over that table instead of per-contour OpenCV calls.
+"""
+
+import cv2
+import numpy as np
+
+FEATURE_COLUMNS = (
+    "area", "perimeter", "circularity", "solidity",
+    "aspect_ratio",    # w / h of the contour bounding box
+    "approx_aspect",   # w / h of the approxPolyDP polygon bounding box
+    "vertices",
+    "m00", "cx", "cy", "mu20", "mu11", "mu02",
+)
+F = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+SHAPE_NAMES = ("circle", "triangle", "square", "rectangle", "polygon")
+
+APPROX_EPSILON = 0.02  # approxPolyDP tolerance, fraction of the perimeter
+
+# ===============================
+# Feature Extraction
+# ===============================
+
+def Extract_Features(contours, epsilon=APPROX_EPSILON, area_range=None):
+    """
+    Build the feature table for a list of contours
+
+    area_range: optional (min, max); rows outside it only get their
+                moments filled, which is enough to reject them.
+
+    Returns:
+        np.ndarray: (N, len(FEATURE_COLUMNS)) float64, one row per contour
+    """
+    table = np.zeros((len(contours), len(FEATURE_COLUMNS)), dtype=np.float64)
+    hull_area = np.zeros(len(contours), dtype=np.float64)
+
+    for i, (row, contour) in enumerate(zip(table, contours)):
+        M = cv2.moments(contour)
+        row[F["area"]] = M["m00"]              # == cv2.contourArea
+        row[F["m00"]] = M["m00"]
+        if area_range is not None and not (area_range[0] < M["m00"] < area_range[1]):
+            continue
+
+        perimeter = cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, epsilon * perimeter, True)
+
+        _, _, w, h = cv2.boundingRect(contour)
+        _, _, aw, ah = cv2.boundingRect(approx)
+
+        row[F["perimeter"]] = perimeter
+        hull_area[i] = cv2.contourArea(cv2.convexHull(contour))
+        row[F["aspect_ratio"]] = w / h if h > 0 else 0.0
+        row[F["approx_aspect"]] = aw / ah if ah > 0 else 0.0
+        row[F["vertices"]] = len(approx)
+        row[F["mu20"]] = M["mu20"]
+        row[F["mu11"]] = M["mu11"]
+        row[F["mu02"]] = M["mu02"]
+        if M["m00"] != 0:
+            row[F["cx"]] = M["m10"] / M["m00"]
+            row[F["cy"]] = M["m01"] / M["m00"]
+
+    # Ratios in one pass over the columns
+    area = table[:, F["area"]]
+    perimeter = table[:, F["perimeter"]]
+
+    np.divide(4 * np.pi * area, perimeter ** 2, out=table[:, F["circularity"]],
+              where=perimeter > 0)
+    np.divide(area, hull_area, out=table[:, F["solidity"]], where=hull_area > 0)
+
+    return table
+
+# ===============================
+# Vectorized Classification
+# ===============================
+
+def Classify_Shapes(features, circularity=(0.80, 1.2), square_aspect=(0.9, 1.1),
+                    aspect_column="approx_aspect"):
+    """
+    Rule table over the feature table, first matching rule wins:
+
+        circularity in (lo, hi]        -> circle
+        3 vertices                     -> triangle
+        4 vertices, aspect in [lo, hi] -> square
+        4 vertices                     -> rectangle
+        otherwise                      -> polygon
+
+    Returns:
+        np.ndarray: shape name per row (dtype U16)
+    """
+    circ = features[:, F["circularity"]]
+    vertices = features[:, F["vertices"]]
+    aspect = features[:, F[aspect_column]]
+
+    is_square = (square_aspect[0] <= aspect) & (aspect <= square_aspect[1])
+
+    conditions = [
+        (circularity[0] < circ) & (circ <= circularity[1]),
+        vertices == 3,
+        (vertices == 4) & is_square,
+        vertices == 4,
+    ]
+    return np.select(conditions, np.array(SHAPE_NAMES[:4], dtype="U16"), default=SHAPE_NAMES[4])
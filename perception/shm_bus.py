@@ -0,0 +1,418 @@
+"""
+Shared-memory detection bus
+
+One multiprocessing.shared_memory segment holds the newest camera frame
+and the newest detection array, so the vision process and the motion
+process can run on separate cores and exchange data without files or
+serialization. VisionProcess creates the bus at the camera's resolution
+and runs Run_Vision_Process as its single writer.
+
+Each section is guarded by a sequence counter (seqlock): the single writer
+makes the counter odd while writing and even when done; readers retry
+until they copy a section with the same even counter before and after.
+"""
+
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+BUS_NAME = "mv_detection_bus"
+
+# Detection columns; color/shape are stored as indices into the name lists
+DET_COLUMNS = ("X", "Y", "R", "cx", "cy", "area", "color", "shape")
+COLOR_NAMES = ("red", "blue", "green", "yellow", "orange", "purple", "cyan", "black")
+SHAPE_NAMES = ("circle", "triangle", "square", "rectangle", "polygon")
+
+# Header slots (int64)
+FRAME_SEQ, DET_SEQ = 0, 1
+FRAME_H, FRAME_W, FRAME_C = 3, 4, 5
+DET_COUNT, MAX_DET = 6, 7
+FRAME_TIME_NS, DET_TIME_NS, DET_FRAME_SEQ, DET_CAPTURE_NS = 8, 9, 10, 11
+HEADER_SLOTS = 16
+
+MAX_DETECTIONS = 64
+STOP_TIMEOUT = 5.0           # s for the vision process to exit before it is terminated
+
+WRITER_STALL_TIMEOUT = 2.0   # s a section may stay mid-write before the writer is presumed dead
+READ_BACKOFF_MAX = 0.001     # s, longest sleep between read attempts
+
+
+def Open_Shared_Memory(name):
+    """
+    Attach to an existing segment without letting this process's resource
+    tracker unlink it on exit (only the creator owns the segment)
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        pass
+
+    from multiprocessing import resource_tracker
+
+    # A forked child shares its parent's tracker, which must keep the
+    # creator's registration; only a tracker of our own has to forget it.
+    tracker = getattr(resource_tracker, "_resource_tracker", None)
+    shared_tracker = getattr(tracker, "_fd", None) is not None
+
+    shm = shared_memory.SharedMemory(name=name)
+    if not shared_tracker:
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+
+class DetectionBus:
+    """
+    Frame / detections exchange over shared memory
+
+    Create it once in the owning process with DetectionBus.create() and
+    attach from the others with DetectionBus.attach(). Each section must
+    have a single writer.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+
+        self.header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        h, w, c = (int(v) for v in self.header[FRAME_H:FRAME_C + 1])
+        max_det = int(self.header[MAX_DET])
+
+        offset = self.header.nbytes
+        self.frame = np.ndarray((h, w, c), dtype=np.uint8, buffer=shm.buf, offset=offset)
+        offset += Align(self.frame.nbytes)
+        self.detections = np.ndarray((max_det, len(DET_COLUMNS)), dtype=np.float64,
+                                     buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def create(cls, frame_shape, name=BUS_NAME, max_detections=MAX_DETECTIONS):
+        """frame_shape: (h, w, c) of the frames that will be published (Probe_Frame_Shape)"""
+        h, w, c = frame_shape
+        size = HEADER_SLOTS * 8 + Align(h * w * c) + max_detections * len(DET_COLUMNS) * 8
+
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by an owner that crashed before close()
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[FRAME_H:FRAME_C + 1] = (h, w, c)
+        header[MAX_DET] = max_detections
+        del header
+
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=BUS_NAME):
+        return cls(Open_Shared_Memory(name), owner=False)
+
+    def close(self):
+        """Detach; the owner also removes the segment"""
+        del self.header, self.frame, self.detections
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # ===============================
+    # Seqlock Helpers
+    # ===============================
+
+    def _begin_write(self, slot):
+        self.header[slot] += 1          # odd: write in progress
+
+    def _end_write(self, slot):
+        self.header[slot] += 1          # even: section consistent
+
+    def _read(self, slot, copy_fn):
+        # Retry while the writer makes progress, yielding first and then
+        # backing off; only a writer stuck mid-write for WRITER_STALL_TIMEOUT
+        # (crashed) raises
+        delay = 0.0
+        last = None
+        last_change = time.monotonic()
+
+        while True:
+            before = int(self.header[slot])
+            if not before & 1:
+                result = copy_fn()
+                if int(self.header[slot]) == before:
+                    return before // 2, result
+
+            now = time.monotonic()
+            if before != last:
+                last, last_change = before, now
+            elif now - last_change > WRITER_STALL_TIMEOUT:
+                raise TimeoutError("Shared-memory bus writer stalled in the middle of a write")
+
+            time.sleep(delay)
+            delay = min(2 * delay if delay else 0.00005, READ_BACKOFF_MAX)
+
+    def sequence(self, slot):
+        """Number of completed writes to a section (FRAME_SEQ, DET_SEQ)"""
+        return int(self.header[slot]) // 2
+
+    # ===============================
+    # Frame
+    # ===============================
+
+    def publish_frame(self, frame, capture_ns=None):
+        """capture_ns: time.monotonic_ns() when the frame was grabbed (default: now)"""
+        self._begin_write(FRAME_SEQ)
+        np.copyto(self.frame, frame)
+        self.header[FRAME_TIME_NS] = time.monotonic_ns() if capture_ns is None else capture_ns
+        self._end_write(FRAME_SEQ)
+
+    def read_frame(self, out=None):
+        """
+        Returns:
+            tuple: (sequence number, capture time in monotonic ns, frame copy)
+        """
+        if out is None:
+            out = np.empty_like(self.frame)
+
+        def copy():
+            np.copyto(out, self.frame)
+            return int(self.header[FRAME_TIME_NS])
+
+        seq, stamp = self._read(FRAME_SEQ, copy)
+        return seq, stamp, out
+
+    # ===============================
+    # Detections
+    # ===============================
+
+    def publish_detections(self, detections, frame_seq=-1, capture_ns=-1):
+        """
+        Args:
+            detections: dict of column arrays (results_store layout)
+            frame_seq: sequence number of the frame they were computed from
+            capture_ns: monotonic capture time of that frame
+        """
+        count = min(len(detections["X"]), len(self.detections))
+        rows = self.detections[:count]
+
+        self._begin_write(DET_SEQ)
+        for col, name in enumerate(DET_COLUMNS):
+            if name == "color":
+                rows[:, col] = Encode_Names(detections[name][:count], COLOR_NAMES)
+            elif name == "shape":
+                rows[:, col] = Encode_Names(detections[name][:count], SHAPE_NAMES)
+            elif name in detections:
+                rows[:, col] = detections[name][:count]
+            else:
+                rows[:, col] = 0.0
+        self.header[DET_COUNT] = count
+        self.header[DET_TIME_NS] = time.monotonic_ns()
+        self.header[DET_FRAME_SEQ] = frame_seq
+        self.header[DET_CAPTURE_NS] = capture_ns
+        self._end_write(DET_SEQ)
+
+    def read_detections(self):
+        """
+        Returns:
+            tuple: (sequence number, dict of column arrays with "timestamp_ns",
+                    "frame_seq" and "capture_ns" entries)
+        """
+        def copy():
+            count = int(self.header[DET_COUNT])
+            return (self.detections[:count].copy(), int(self.header[DET_TIME_NS]),
+                    int(self.header[DET_FRAME_SEQ]), int(self.header[DET_CAPTURE_NS]))
+
+        seq, (rows, stamp, frame_seq, capture_ns) = self._read(DET_SEQ, copy)
+
+        columns = {name: rows[:, col] for col, name in enumerate(DET_COLUMNS)}
+        columns["color"] = Decode_Names(columns["color"], COLOR_NAMES)
+        columns["shape"] = Decode_Names(columns["shape"], SHAPE_NAMES)
+        columns["timestamp_ns"] = stamp
+        columns["frame_seq"] = frame_seq
+        columns["capture_ns"] = capture_ns
+
+        return seq, columns
+
+
+# ===============================
+# Vision Process
+# ===============================
+
+def Run_Vision_Process(bus_name=BUS_NAME, camera_index=1, stop_event=None, monitor=None,
+                       **detect_args):
+    """
+    Capture → detect → publish loop, meant as a multiprocessing.Process
+    target so vision runs on its own core next to the motion process
+
+    Args:
+        bus_name: name of a bus created with DetectionBus.create()
+        camera_index: cv2.VideoCapture index (or a video file, e.g. a
+                      conveyor.Synthetic_Belt_Video recording)
+        stop_event: multiprocessing.Event ending the loop
+        monitor: optional Calibration_App.Calibration_Monitor fed every raw frame
+        detect_args: forwarded to shape.Detect_Objects
+    """
+    from . import shape
+    from .calibration_cache import Undistort_Frame
+
+    bus = DetectionBus.attach(bus_name)
+    cap = cv2.VideoCapture(camera_index)
+
+    if not cap.isOpened():
+        print("Error: Could not open camera.")
+        bus.close()
+        return
+
+    # Replay files at their recorded rate so capture times match scene motion
+    period_ns = 0
+    if isinstance(camera_index, str):
+        period_ns = int(1e9 / (cap.get(cv2.CAP_PROP_FPS) or 30.0))
+    next_ns = time.monotonic_ns()
+
+    undistorted = None
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if period_ns:
+                time.sleep(max(0, next_ns - time.monotonic_ns()) * 1e-9)
+                next_ns += period_ns
+
+            ret, frame = cap.read()
+            capture_ns = time.monotonic_ns()
+            if not ret:
+                print("Failed to grab frame")
+                break
+
+            if monitor is not None:
+                monitor.check(frame)
+
+            if undistorted is None:
+                if frame.shape != bus.frame.shape:
+                    print(f"Error: camera frames are {frame.shape}, the bus holds "
+                          f"{bus.frame.shape}; create it from the capture (VisionProcess)")
+                    break
+                undistorted = np.empty_like(frame)
+            frame = Undistort_Frame(frame, undistorted)
+            bus.publish_frame(frame, capture_ns)
+            frame_seq = bus.sequence(FRAME_SEQ)
+
+            objects = shape.Detect_Objects(frame, **detect_args)
+            objects = sorted(objects, key=lambda obj: obj["center"][0])
+            image_size = (frame.shape[1], frame.shape[0])
+            bus.publish_detections(shape.Objects_To_Detections(objects, image_size),
+                                   frame_seq, capture_ns)
+    finally:
+        cap.release()
+        bus.close()
+
+
+def Probe_Frame_Shape(camera_index=1):
+    """(h, w, c) of the frames a capture source delivers"""
+    cap = cv2.VideoCapture(camera_index)
+    try:
+        ret, frame = cap.read() if cap.isOpened() else (False, None)
+    finally:
+        cap.release()
+    if not ret:
+        raise RuntimeError("Could not read a frame from the camera.")
+    return frame.shape
+
+
+class VisionProcess:
+    """
+    Owner of a bus and of the Run_Vision_Process writing to it
+
+    The bus is sized from a frame read from the capture source, so any
+    camera resolution fits; stop() ends the process and unlinks the bus.
+    """
+
+    def __init__(self, camera_index=1, bus_name=BUS_NAME, max_detections=MAX_DETECTIONS,
+                 **detect_args):
+        self.camera_index = camera_index
+        self.bus_name = bus_name
+        self.max_detections = max_detections
+        self.detect_args = detect_args
+
+        self.bus = None
+        self.process = None
+        self._stop = multiprocessing.Event()
+
+    def start(self):
+        shape = Probe_Frame_Shape(self.camera_index)
+        self.bus = DetectionBus.create(shape, self.bus_name, self.max_detections)
+
+        self._stop.clear()
+        self.process = multiprocessing.Process(
+            target=Run_Vision_Process, args=(self.bus_name, self.camera_index, self._stop),
+            kwargs=self.detect_args, daemon=True, name="vision")
+        self.process.start()
+        return self
+
+    def wait_detections(self, timeout=10.0):
+        """Block until the first detection set is published"""
+        deadline = time.monotonic() + timeout
+        while self.bus.sequence(DET_SEQ) == 0:
+            if not self.process.is_alive() or time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self.process is not None:
+            self.process.join(timeout=STOP_TIMEOUT)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
+
+
+def main(camera_index=1):
+    """Run the vision process and report its detection rate until Ctrl+C"""
+    vision = VisionProcess(camera_index).start()
+    try:
+        if not vision.wait_detections():
+            print("Vision process did not publish any detections")
+            return
+
+        last_seq, last_time = vision.bus.sequence(DET_SEQ), time.monotonic()
+        while vision.process.is_alive():
+            time.sleep(1.0)
+            seq, detections = vision.bus.read_detections()
+            now = time.monotonic()
+            print(f"{(seq - last_seq) / (now - last_time):.1f} detection sets/s, "
+                  f"{len(detections['X'])} objects")
+            last_seq, last_time = seq, now
+    except KeyboardInterrupt:
+        print("\nVision process stopped by user")
+    finally:
+        vision.stop()
+
+# ===============================
+# Helpers
+# ===============================
+
+def Align(nbytes, alignment=64):
+    return (nbytes + alignment - 1) // alignment * alignment
+
+
+def Encode_Names(names, table):
+    """Map names to their index in table (-1 when unknown)"""
+    lookup = {name: i for i, name in enumerate(table)}
+    return np.array([lookup.get(str(name), -1) for name in names], dtype=np.float64)
+
+
+def Decode_Names(codes, table):
+    names = np.array(table + ("",), dtype="U16")
+    return names[codes.astype(np.int64)]  # -1 picks the trailing ""
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+
+from perception.mg400_kinematics import (
+    Inverse_Kinematics,
+    Forward_Kinematics,
+    Check_Targets,
+    Order_By_Travel_Time,
+)
+from perception.robot_move import HOME_POINT, DROP_POINT, DROP_POINT_UP, PICK_Z, SAFE_Z_OFFSET
+
+
+REACHABLE = [
+    HOME_POINT,
+    DROP_POINT,
+    DROP_POINT_UP,
+    [300.0, 0.0, PICK_Z, 0.0],
+    [250.0, 100.0, -50.0, 30.0],
+    [320.0, -150.0, PICK_Z + SAFE_Z_OFFSET, -120.0],
+]
+
+
+def test_forward_inverts_inverse():
+    q, ok = Inverse_Kinematics(REACHABLE)
+
+    assert ok.all()
+    np.testing.assert_allclose(Forward_Kinematics(q), REACHABLE, atol=1e-6)
+
+
+def test_too_close_to_the_base_is_rejected():
+    _, ok = Inverse_Kinematics([[200.0, 0.0, -167.0, 0.0]])
+
+    assert not ok[0]
+
+
+def test_out_of_range_is_rejected():
+    _, ok = Inverse_Kinematics([[600.0, 0.0, 0.0, 0.0], [-300.0, 0.0, 0.0, 0.0]])
+
+    assert not ok.any()
+
+
+def test_check_targets_needs_both_poses():
+    targets = [
+        ([300.0, 0.0, PICK_Z + SAFE_Z_OFFSET, 0.0], [300.0, 0.0, PICK_Z, 0.0]),
+        ([200.0, 0.0, PICK_Z + SAFE_Z_OFFSET, 0.0], [200.0, 0.0, PICK_Z, 0.0]),
+    ]
+
+    np.testing.assert_array_equal(Check_Targets(targets), [True, False])
+    assert Check_Targets([]).shape == (0,)
+
+
+def test_check_targets_forbidden_zone_on_descent():
+    target = ([300.0, 0.0, PICK_Z + SAFE_Z_OFFSET, 0.0], [300.0, 0.0, PICK_Z, 0.0])
+    zone = (280.0, 320.0, -20.0, 20.0, -140.0, -130.0)   # between high and low
+
+    assert Check_Targets([target], zones=[zone]).tolist() == [False]
+    assert Check_Targets([target], zones=[]).tolist() == [True]
+
+
+def test_order_by_travel_time():
+    near = ([340.0, 10.0, -100.0, 0.0], [340.0, 10.0, PICK_Z, 0.0])
+    far = ([250.0, -150.0, -100.0, 0.0], [250.0, -150.0, PICK_Z, 0.0])
+
+    ordered, times = Order_By_Travel_Time([far, near], HOME_POINT)
+
+    assert ordered == [near, far]
+    assert times[0] <= times[1]
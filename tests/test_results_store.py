@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+from perception.results_store import Save_Detections, Load_Detections, Make_Detections
+
+
+def Sample_Detections():
+    return Make_Detections(
+        3,
+        X=[300.5, 250.0, 410.25],
+        Y=[-12.0, 80.5, 0.0],
+        R=[0.0, 45.0, -30.0],
+        cx=[120.0, 300.5, 512.0],
+        cy=[200.0, 64.0, 400.25],
+        area=[1500.0, 2300.0, 1800.0],
+        color=["red", "blue", "yellow"],
+        shape=["square", "circle", "circle"],
+    )
+
+
+def test_save_load_roundtrip(tmp_path):
+    path = str(tmp_path / "detections.npz")
+    detections = Sample_Detections()
+
+    Save_Detections(detections, path, index=False)
+    loaded = Load_Detections(path)
+
+    assert set(loaded) == set(detections) | {"timestamp"}
+    for name, column in detections.items():
+        np.testing.assert_array_equal(loaded[name], column)
+        assert loaded[name].dtype == column.dtype
+
+
+def test_load_selected_fields(tmp_path):
+    path = str(tmp_path / "detections.npz")
+    Save_Detections(Sample_Detections(), path, index=False)
+
+    loaded = Load_Detections(path, fields=("X", "color"))
+
+    assert set(loaded) == {"X", "color", "timestamp"}
+    np.testing.assert_array_equal(loaded["color"], ["red", "blue", "yellow"])
+
+
+def test_extra_columns_and_missing_defaults(tmp_path):
+    path = str(tmp_path / "detections.npz")
+    features = np.arange(6, dtype=np.float64).reshape(3, 2)
+
+    Save_Detections({"X": [1.0, 2.0, 3.0], "Y": [4.0, 5.0, 6.0]}, path, index=False,
+                    extra={"features": features})
+    loaded = Load_Detections(path, fields=("X", "R", "features"))
+
+    np.testing.assert_array_equal(loaded["features"], features)
+    np.testing.assert_array_equal(loaded["R"], np.zeros(3))
+    with pytest.raises(KeyError):
+        Load_Detections(path, fields=("no_such_column",))
+
+
+def test_save_replaces_previous_file(tmp_path):
+    path = str(tmp_path / "detections.npz")
+    Save_Detections(Sample_Detections(), path, index=False)
+    Save_Detections(Make_Detections(0), path, index=False)
+
+    assert len(Load_Detections(path)["X"]) == 0
+    assert [p.name for p in tmp_path.iterdir()] == ["detections.npz"]
+
+
+def test_saved_file_has_default_permissions(tmp_path):
+    path = str(tmp_path / "detections.npz")
+    plain = tmp_path / "plain.npz"
+    plain.write_bytes(b"")
+
+    Save_Detections(Sample_Detections(), path, index=False)
+
+    assert os.stat(path).st_mode & 0o777 == plain.stat().st_mode & 0o777
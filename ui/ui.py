@@ -11,9 +11,13 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import perception.object as obj
+import perception.background as background
 import calibration.Calibration_App as calib
+import calibration.Robot_Calibration as robot_calib
 import perception.robot_move as move
 import perception.shape as shape
+import perception.cycle_scheduler as cycle_scheduler
+import perception.conveyor as conveyor
 
 # Initialize session state
 if "show_camera" not in st.session_state:
@@ -80,16 +84,38 @@ with col2:
     if st.button("⛔ Mark Image Cordinates"):
         # st.error("Robot Stopped!")
         calib.Get_Image_Points()
+    if st.button("🎯 Auto Calibrate (Markers)"):
+        if calib.Auto_Calibrate():
+            st.success("H Matrix Generated from Markers!")
+        else:
+            st.error("Marker calibration failed, see console.")
 
 with col3:
     if st.button("🔧 Calibration"):
         calib.main()
         st.success("H Matrix Generation Completed!")
+    if st.button("🦾 Robot Auto Calibration"):
+        if move.move is None:
+            st.error("Connect to DOBOT first.")
+        elif robot_calib.Run_Robot_Calibration(move.move):
+            st.success("H Matrix Generated from Robot Poses!")
+        else:
+            st.error("Robot calibration failed, see console.")
 
 with col4:
+    segmenter = st.selectbox("Segmentation", background.SEGMENTERS,
+                             index=background.SEGMENTERS.index(background.DEFAULT_SEGMENTER))
     if st.button("🤖 Object Detection"):
         st.info("Detecting Objects...")
-        obj.main()
+        try:
+            obj.main(segmenter)
+        except FileNotFoundError as e:
+            st.error(str(e))
+    if st.button("🧱 Learn Background (empty tray)"):
+        if background.Learn_Background() is not None:
+            st.success("Background reference saved!")
+        else:
+            st.error("Could not capture the background, see console.")
 
 with col5:
     if st.button("▶ Connect to DOBOT"):
@@ -202,9 +228,29 @@ with col2:
 with col3:
     if st.button("✅ Select All"):
         move.main()
+    if st.button("🔁 Continuous Pick"):
+        if move.move is None:
+            st.error("Connect to DOBOT first.")
+        else:
+            detect, release = cycle_scheduler.Camera_Detector()
+            try:
+                picks = cycle_scheduler.Run_Continuous_Picking(move.move, move.dashboard, detect)
+                st.success(f"Picked {picks} objects")
+            finally:
+                release()
 with col4:
     if st.button("Select Red"):
         move.main('red')
+    belt_picks = st.number_input("Belt picks", min_value=1, value=10, step=1)
+    if st.button("🛤 Conveyor Pick"):
+        if move.move is None:
+            st.error("Connect to DOBOT first.")
+        else:
+            latency = conveyor.Run_Conveyor(move.move, move.dashboard, max_picks=int(belt_picks))
+            if latency is None:
+                st.error("No detections from the camera.")
+            else:
+                st.success(f"Picked {len(latency.rows)} objects from the belt")
 with col5:
     if st.button("Select Blue"):
         move.main('blue')